@@ -0,0 +1,281 @@
+import hashlib
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+from sqlalchemy.exc import SQLAlchemyError
+
+import exporter
+from compression import compress_response
+from database import replica_reads
+from helpers import artist_shows_query, listing_filters, name_index, page_cache, show_filters, \
+    show_listing_query, split_shows, venue_shows_query
+from models import db, Venue, Artist, Show, ENTITY_MODELS, VENUE_FIELDS, ARTIST_FIELDS, \
+    SHOW_FIELDS, delete_rows, export_columns, split_genres
+from pagination import keyset_page, keyset_query, clamp_page_size
+from query_budget import query_budget
+from typeahead import normalize
+
+bp = Blueprint('api', __name__)
+
+
+#  API
+#  ----------------------------------------------------------------
+# JSON, /api/v1/<entity>[/<id>]?fields=a,b sends only the named fields;
+# DELETE /api/v1/<entity> deletes rows in bulk
+
+
+API_RESOURCES = {
+    # fields, listing keys, extra detail fields
+    'venues': (VENUE_FIELDS, [Venue.id], {'past_shows', 'upcoming_shows'}),
+    'artists': (ARTIST_FIELDS, [Artist.id], {'past_shows', 'upcoming_shows'}),
+    'shows': (SHOW_FIELDS, [Show.event_date, Show.id], set()),
+}
+
+
+def _api_json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def api_response(payload):
+    # strong ETag over the body, so unchanged resources are answered with a 304
+    body = json.dumps(payload, separators=(',', ':'), default=_api_json_default)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    response.cache_control.no_cache = True
+    # compressed here rather than after the request, so If-None-Match is
+    # checked against the tag of the encoding sent, e.g. "<sha1>-gzip"
+    return compress_response(response).make_conditional(request)
+
+
+def api_error(status, message):
+    return jsonify({'error': message}), status
+
+
+def api_fields(available, extras=frozenset()):
+    # requested ?fields=, or every field; None if any is unknown
+    if 'fields' not in request.args:
+        return list(available) + sorted(extras)
+    fields = [name for name in request.args['fields'].split(',') if name]
+    if not fields or any(name not in available and name not in extras for name in fields):
+        return None
+    return fields
+
+
+def api_rows(query, fields):
+    # rows as dicts of the requested fields, genres as lists
+    rows = []
+    for row in query:
+        item = dict(zip(fields, row))
+        if 'genres' in item:
+            item['genres'] = split_genres(item['genres'])
+        rows.append(item)
+    return rows
+
+
+class ApiRequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Each endpoint is split in two, so that the async mode (asgi.py) can run the
+# same statements on its own engine: *_statements() builds the SQL of the
+# request, *_response() turns the fetched rows into the response.
+
+def api_list_statements(entity):
+    # (statement, fields, per_page) of the requested listing page
+    if entity not in API_RESOURCES:
+        raise ApiRequestError(404, f'unknown resource {entity!r}')
+    available, keys, _ = API_RESOURCES[entity]
+    fields = api_fields(available)
+    if fields is None:
+        raise ApiRequestError(400, f'fields must be among {", ".join(available)}')
+
+    # key columns ride along behind the requested fields for the cursors
+    columns = [available[name].label(name) for name in fields] + \
+        [key.label(f'_key{i}') for i, key in enumerate(keys)]
+    if entity == 'shows':
+        try:
+            filters = show_filters()
+        except ValueError:
+            raise ApiRequestError(400, 'from and to must be ISO datetimes, venue_id and artist_id ids')
+        # the (event_date, id) cursor can't page past a NULL date
+        query = show_listing_query([], request.args.get('upcoming', type=int) == 1).\
+            add_columns(*columns).filter(Show.event_date.isnot(None), *filters)
+    else:
+        query = db.session.query(*columns).filter(*listing_filters(ENTITY_MODELS[entity]))
+
+    per_page = clamp_page_size(request.args.get('per_page'),
+                               current_app.config['PAGE_SIZE'], current_app.config['MAX_PAGE_SIZE'])
+    try:
+        query = keyset_query(query, keys, per_page,
+                             after=request.args.get('after'),
+                             before=request.args.get('before'))
+    except ValueError:
+        raise ApiRequestError(400, 'invalid cursor')
+    return query.statement, fields, per_page
+
+
+def api_list_response(rows, fields, per_page):
+    page = keyset_page(rows, lambda row: tuple(row[len(fields):]), per_page,
+                       after=request.args.get('after'),
+                       before=request.args.get('before'))
+    return api_response({
+        'data': api_rows(page.items, fields),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+@bp.route('/api/v1/<entity>')
+@query_budget(1)
+@replica_reads
+def api_list(entity):
+    try:
+        statement, fields, per_page = api_list_statements(entity)
+    except ApiRequestError as error:
+        return api_error(error.status, error.message)
+    return api_list_response(db.session.execute(statement).all(), fields, per_page)
+
+
+def api_detail_statements(entity, id):
+    # (row statement, its fields, shows statement or None, requested fields)
+    if entity not in API_RESOURCES:
+        raise ApiRequestError(404, f'unknown resource {entity!r}')
+    available, keys, extras = API_RESOURCES[entity]
+    fields = api_fields(available, extras)
+    if fields is None:
+        raise ApiRequestError(
+            400, f'fields must be among {", ".join(list(available) + sorted(extras))}')
+
+    columns = [available[name].label(name) for name in fields if name in available]
+    if entity == 'shows':
+        query = show_listing_query([]).add_columns(*columns).filter(Show.id == id)
+    else:
+        model = ENTITY_MODELS[entity]
+        query = db.session.query(*columns).filter(model.id == id) if columns else \
+            db.session.query(model.id).filter(model.id == id)
+
+    shows_query = None
+    if extras.intersection(fields):
+        shows_query = (venue_shows_query if entity == 'venues' else artist_shows_query)(id)
+    return (query.limit(1).statement, [name for name in fields if name in available],
+            shows_query.statement if shows_query is not None else None, fields)
+
+
+def api_detail_response(entity, id, rows, row_fields, show_rows, fields):
+    rows = api_rows(rows, row_fields)
+    if not rows:
+        return api_error(404, f'{entity[:-1]} {id} not found')
+    item = rows[0]
+
+    if show_rows is not None:
+        past_shows, upcoming_shows = split_shows(show_rows)
+        if 'past_shows' in fields:
+            item['past_shows'] = past_shows
+        if 'upcoming_shows' in fields:
+            item['upcoming_shows'] = upcoming_shows
+    return api_response({'data': item})
+
+
+@bp.route('/api/v1/<entity>/<int:id>')
+@query_budget(2)
+@replica_reads
+def api_detail(entity, id):
+    try:
+        statement, row_fields, shows_statement, fields = api_detail_statements(entity, id)
+    except ApiRequestError as error:
+        return api_error(error.status, error.message)
+
+    rows = db.session.execute(statement).all()
+    show_rows = db.session.execute(shows_statement).all() \
+        if rows and shows_statement is not None else None
+    return api_detail_response(entity, id, rows, row_fields, show_rows, fields)
+
+
+@bp.route('/api/v1/<entity>/typeahead')
+@query_budget(1)
+@replica_reads
+def api_typeahead(entity):
+    # venues or artists whose name, or a later word of it, starts with ?q=;
+    # served from memory, the query only runs when the names are (re)loaded
+    if entity not in ('venues', 'artists'):
+        return api_error(404, f'no typeahead for {entity!r}')
+    prefix = normalize(request.args.get('q'))
+    if not prefix:
+        return api_error(400, 'q is required')
+    limit = clamp_page_size(request.args.get('limit'), current_app.config['TYPEAHEAD_LIMIT'],
+                            current_app.config['TYPEAHEAD_MAX_LIMIT'])
+    return api_response({'data': name_index.lookup(entity, prefix, limit)})
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+
+@bp.route('/export/<entity>.<fmt>')
+@query_budget(1)
+@replica_reads
+def export(entity, fmt):
+    # streams a whole table, ?since=<iso datetime> keeps rows created after it
+    if entity not in ENTITY_MODELS or fmt not in exporter.FORMATS:
+        abort(404)
+    since = request.args.get('since', type=datetime.fromisoformat)
+    if 'since' in request.args and since is None:
+        abort(400)
+
+    model = ENTITY_MODELS[entity]
+    chunks = exporter.export_chunks(db.session, model.__table__, export_columns(model), fmt,
+                                    since=since, chunk_size=current_app.config['EXPORT_CHUNK_SIZE'])
+    return Response(stream_with_context(chunks), mimetype=exporter.FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename={entity}.{fmt}',
+    })
+
+
+#  Bulk delete
+#  ----------------------------------------------------------------
+
+
+@bp.route('/api/v1/<entity>', methods=['DELETE'])
+@query_budget(4)
+def api_bulk_delete(entity):
+    # deletes the venues, artists or shows whose ids the JSON body lists,
+    # {"ids": [1, 2, 3]}, their shows with them, in one transaction
+    if entity not in ENTITY_MODELS:
+        return api_error(404, f'unknown resource {entity!r}')
+    body = request.get_json(silent=True)
+    ids = body.get('ids') if isinstance(body, dict) else None
+    limit = current_app.config['BULK_DELETE_MAX']
+    if not isinstance(ids, list) or not 0 < len(ids) <= limit or \
+            not all(type(id) is int for id in ids):
+        return api_error(400, f'the body must be {{"ids": [...]}} with 1 to {limit} integer ids')
+
+    model = ENTITY_MODELS[entity]
+    try:
+        if model is Show:
+            # the pages showing a show are tagged with its venue and artist
+            owners = db.session.query(Show.venue_id, Show.artist_id).\
+                filter(Show.id.in_(ids)).distinct().all()
+            tags = [f'venue:{venue_id}' for venue_id, _ in owners] + \
+                [f'artist:{artist_id}' for _, artist_id in owners]
+        else:
+            tags = [f'{entity[:-1]}:{id}' for id in ids]
+        deleted = delete_rows(model, ids)
+        db.session.commit()
+    except SQLAlchemyError:
+        # nothing is deleted, the counters neither
+        db.session.rollback()
+        current_app.logger.exception('bulk delete of %s failed', entity)
+        return api_error(500, f'the {entity} could not be deleted')
+    finally:
+        db.session.close()
+
+    # the listings show, or filter on, the show counters
+    page_cache.invalidate('shows', 'venues', 'artists', *tags)
+    if model is not Show:
+        name_index.invalidate(entity)
+    return jsonify({'deleted': deleted})
@@ -0,0 +1,181 @@
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+
+import search
+from database import replica_reads
+from helpers import artist_page, artist_shows_query, cache_tags, cached_page, listing_filters, \
+    name_index, page_cache, paginate, stream_page
+from models import db, Artist, set_genres, split_genres
+from query_budget import query_budget
+
+bp = Blueprint('artists', __name__)
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists')
+@query_budget(1)
+@cached_page
+@replica_reads
+def artists():
+    # TODO: replace with real data returned from querying the database
+    page = paginate(Artist.query.filter(*listing_filters(Artist)), [Artist.id], lambda artist: (artist.id,))
+
+    def listing():
+        # run by the template as it streams, the query with it
+        cache_tags('artists', *[f'artist:{artist.id}' for artist in page])
+        yield from page.items
+
+    return stream_page('pages/artists.html', artists=listing(), page=page)
+
+
+@bp.route('/artists/search', methods=['POST'])
+@query_budget(1)
+@replica_reads
+def search_artists():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+    search_keyword = request.form.get('search_term', '')
+
+    count, qs = search.search(db.session, Artist, search_keyword, current_app.config['SEARCH_LIMIT'],
+                              Artist.upcoming_shows_count.label('num_upcoming_shows'),
+                              filters=listing_filters(Artist))
+
+    response = {
+        "count": count,
+        "data": [{
+            'id': artist.id,
+            'name': artist.name,
+            'num_upcoming_shows': artist.num_upcoming_shows
+        } for artist in qs]
+    }
+    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+
+
+@bp.route('/artists/<int:artist_id>')
+@query_budget(2)
+@cached_page
+@replica_reads
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    # TODO: replace with real artist data from the artist table, using artist_id
+    artist = Artist.query.filter_by(id=artist_id).first()
+
+    if not artist:  # if page does not exist rediirect to artist list
+        return redirect(url_for('artists.artists'))
+
+    # about shows, all fetched in one query
+    return artist_page(artist, artist_shows_query(artist.id))
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_budget(1)
+def edit_artist(artist_id):
+    from forms import ArtistForm
+    artist = Artist.query.get(artist_id)
+    form = ArtistForm(obj=artist)  # auto pre populate field
+
+    # TODO: populate form with fields from artist with ID <artist_id>
+
+    # manually prepopulating field sue to difference in field name and form name
+    form.genres.data = split_genres(artist.genres)
+    form.seeking_venue.data = artist.venue_search
+    form.seeking_description.data = artist.description
+
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@query_budget(8)
+def edit_artist_submission(artist_id):
+    # TODO: take values from the form submitted, and update existing
+    # artist record with ID <artist_id> using the new attributes
+    from forms import ArtistForm
+    try:
+        form = ArtistForm()
+        artist = Artist.query.get(artist_id)
+
+        artist.name = form.name.data
+        artist.city = form.city.data
+        artist.state = form.state.data
+        artist.phone = form.phone.data
+        artist.website_link = form.website_link.data
+        artist.facebook_link = form.facebook_link.data
+        artist.venue_search = form.seeking_venue.data
+        artist.description = form.seeking_description.data
+        artist.image_link = form.image_link.data
+        # last: its Genre lookup autoflushes, any column set after it would
+        # take a second UPDATE
+        set_genres(artist, form.genres.data)
+
+        db.session.commit()
+        page_cache.invalidate(f'artist:{artist_id}', 'artists')
+        name_index.invalidate('artists')
+    except:
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/create', methods=['GET'])
+@query_budget(0)
+def create_artist_form():
+    from forms import ArtistForm
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/artists/create', methods=['POST'])
+@query_budget(5)
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+
+    from forms import ArtistForm
+    form = ArtistForm(request.form)
+
+    try:
+        data = Artist(
+            name=form.name.data,
+            city=form.city.data,
+            state=form.state.data,
+            # address=form.address.data,
+            phone=form.phone.data,
+            facebook_link=form.facebook_link.data,
+            image_link=form.image_link.data,
+            website_link=form.website_link.data,
+            venue_search=form.seeking_venue.data,
+            description=form.seeking_description.data,
+        )
+        set_genres(data, form.genres.data)
+        db.session.add(data)
+        db.session.commit()
+        page_cache.invalidate('artists')
+        name_index.invalidate('artists')
+
+        # on successful db insert, flash success
+        flash('Artist ' + request.form['name'] + ' was successfully listed!')
+    except:
+        db.session.rollback()
+
+        # TODO: on unsuccessful db insert, flash an error instead.
+        flash('An error occurred. Artist ' +
+              request.form.get('name') + ' could not be listed.')
+        # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    finally:
+        db.session.close()
+
+    return render_template('pages/home.html')
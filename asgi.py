@@ -0,0 +1,190 @@
+'''
+Optional async serving mode, under an ASGI server:
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:application --workers 4
+
+The read-only JSON API and the venue and artist pages run on async SQLAlchemy
+engines (asyncpg, or aiosqlite for local testing), so a worker goes on
+serving other requests while their queries wait on the database, and the
+independent queries of a request, such as a venue's row and its shows, run
+concurrently. Every other route is passed to the Flask app through asgiref's
+WSGI adapter, which runs it in a thread pool.
+
+The async endpoints share the Flask views' SQL and rendering: the request is
+read inside a Flask request context, the statements built by api.py and
+helpers.py are awaited here, and those modules turn the rows into the response.
+'''
+import asyncio
+import re
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import make_response, redirect, url_for
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import api
+import compression
+import helpers
+from app import create_app
+from database import REPLICA, reads_from_replica
+from models import db, Venue, Artist
+
+app = create_app()
+
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+_engines = {}
+
+
+def async_engine(bind=None):
+    # the async twin of a Flask-SQLAlchemy engine, same database and pool settings
+    engine = _engines.get(bind)
+    if engine is None:
+        config = app.config
+        url = db.get_engine(app, bind=bind).url
+        backend = url.get_backend_name()
+        options = {}
+        if backend != 'sqlite':
+            options.update(
+                pool_size=config['DB_POOL_SIZE'],
+                max_overflow=config['DB_MAX_OVERFLOW'],
+                pool_pre_ping=config['DB_POOL_PRE_PING'],
+                pool_recycle=config['DB_POOL_RECYCLE'],
+            )
+        if backend == 'postgresql' and config['DB_STATEMENT_TIMEOUT']:
+            options['connect_args'] = {
+                'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT'])}}
+        engine = _engines[bind] = create_async_engine(
+            url.set(drivername=ASYNC_DRIVERS[backend]), **options)
+    return engine
+
+
+def read_engine():
+    return async_engine(REPLICA if reads_from_replica() else None)
+
+
+async def fetch_rows(engine, statement):
+    async with engine.connect() as connection:
+        return (await connection.execute(statement)).all()
+
+
+async def fetch_entity(engine, statement):
+    async with AsyncSession(engine) as session:
+        return (await session.execute(statement)).scalars().first()
+
+
+async def api_list(entity):
+    try:
+        statement, fields, per_page = api.api_list_statements(entity)
+    except api.ApiRequestError as error:
+        return api.api_error(error.status, error.message)
+    rows = await fetch_rows(read_engine(), statement)
+    return api.api_list_response(rows, fields, per_page)
+
+
+async def api_detail(entity, id):
+    id = int(id)
+    try:
+        statement, row_fields, shows_statement, fields = \
+            api.api_detail_statements(entity, id)
+    except api.ApiRequestError as error:
+        return api.api_error(error.status, error.message)
+
+    engine = read_engine()
+    if shows_statement is None:
+        rows, show_rows = await fetch_rows(engine, statement), None
+    else:
+        rows, show_rows = await asyncio.gather(
+            fetch_rows(engine, statement), fetch_rows(engine, shows_statement))
+    return api.api_detail_response(entity, id, rows, row_fields, show_rows, fields)
+
+
+def detail_page(model, shows_query, render, listing):
+    async def page(id):
+        id = int(id)
+        key = helpers.page_cache_key()
+        if key is not None:
+            response = helpers.cached_response(key)
+            if response is not None:
+                return response
+            token = helpers.begin_page()
+
+        engine = read_engine()
+        entity, show_rows = await asyncio.gather(
+            fetch_entity(engine, select(model).where(model.id == id)),
+            fetch_rows(engine, shows_query(id).statement))
+        if entity is None:
+            return redirect(url_for(listing))
+
+        response = make_response(render(entity, show_rows))
+        return helpers.store_page(key, response, token) if key is not None else response
+    return page
+
+
+ROUTES = [
+    (re.compile(r'/api/v1/(\w+)'), api_list),
+    (re.compile(r'/api/v1/(\w+)/(\d+)'), api_detail),
+    (re.compile(r'/venues/(\d+)'),
+     detail_page(Venue, helpers.venue_shows_query, helpers.venue_page, 'venues.venues')),
+    (re.compile(r'/artists/(\d+)'),
+     detail_page(Artist, helpers.artist_shows_query, helpers.artist_page, 'artists.artists')),
+]
+
+wsgi_application = WsgiToAsgi(app)
+
+
+def request_context(scope):
+    headers = [(name.decode('latin-1'), value.decode('latin-1'))
+               for name, value in scope['headers']]
+    host = dict(headers).get('host') or '{}:{}'.format(*scope.get('server') or ('localhost', 80))
+    return app.test_request_context(
+        scope['path'], base_url=f'{scope.get("scheme", "http")}://{host}{scope.get("root_path", "")}',
+        method=scope['method'], query_string=scope['query_string'], headers=headers)
+
+
+async def send_response(response, scope, send):
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.items()],
+    })
+    bodiless = scope['method'] == 'HEAD' or response.status_code in (204, 304)
+    body = b'' if bodiless else response.get_data()
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for engine in _engines.values():
+                await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+        for pattern, handler in ROUTES:
+            match = pattern.fullmatch(scope['path'])
+            if match:
+                # the context carries request, session and g across the awaits;
+                # each request runs in its own task, so contexts don't mix
+                with request_context(scope):
+                    response = compression.compress_response(
+                        make_response(await handler(*match.groups())))
+                await send_response(response, scope, send)
+                return
+
+    await wsgi_application(scope, receive, send)
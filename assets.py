@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import abort, current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped, browsers get the gzip ones
+    brotli = None
+
+
+# Static asset bundles.
+# `flask build-assets` concatenates and minifies the files of each bundle
+# into static/dist, names the result after a hash of its content and writes
+# gzip and brotli variants beside it, plus a manifest of the names. Templates
+# link bundles with asset_urls(), which resolves the hashed name; a hashed
+# file never changes, so it is served with a one year immutable lifetime and
+# browsers don't ask for it again until a deploy changes its name.
+#
+# Without a build (a fresh checkout, local development) asset_urls() lists
+# the bundle's source files instead, served as usual from /static.
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+        'js/script.js',
+    ],
+    'main.js': [
+        'js/libs/jquery-1.11.1.min.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+    'typeahead.js': [
+        'js/typeahead.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+MAX_AGE = 365 * 24 * 3600
+# smaller files gain less from compression than their headers cost
+COMPRESS_MIN_SIZE = 256
+
+
+def minify_css(text):
+    # comments and whitespace only, the rules are left as written;
+    # /*! license comments stay
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip() + '\n'
+
+
+def minify_js(text):
+    # leaves statements and line breaks alone, so automatic semicolon
+    # insertion still sees the same code: drops indentation, blank lines
+    # and the lines that are only a comment
+    lines, in_comment = [], False
+    for line in text.splitlines():
+        line = line.strip()
+        if in_comment:
+            in_comment = '*/' not in line
+            continue
+        if line.startswith('/*') and not line.startswith('/*!'):
+            in_comment = '*/' not in line
+            continue
+        if not line or line.startswith('//'):
+            continue
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def _bundle(static_folder, sources):
+    contents = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as file:
+            text = file.read()
+        if source.endswith('.min.js') or source.endswith('.min.css'):
+            # already minified; a source map comment would point nowhere
+            text = re.sub(r'^//# sourceMappingURL=.*$', '', text, flags=re.M)
+        elif source.endswith('.css'):
+            text = minify_css(text)
+        else:
+            text = minify_js(text)
+        contents.append(text.strip('\n') + '\n')
+    # a script ending without a semicolon must not run into the next one
+    return (';\n' if sources[0].endswith('.js') else '').join(contents).encode('utf-8')
+
+
+def build(static_folder, bundles=BUNDLES):
+    '''
+    writes the bundles into static_folder/dist, replacing an earlier build,
+    and returns the manifest: bundle name -> hashed file name
+    '''
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    os.makedirs(dist)
+
+    manifest = {}
+    for name, sources in bundles.items():
+        body = _bundle(static_folder, sources)
+        stem, extension = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(body).hexdigest()[:12]}{extension}'
+        with open(os.path.join(dist, hashed), 'wb') as file:
+            file.write(body)
+        if len(body) >= COMPRESS_MIN_SIZE:
+            with open(os.path.join(dist, hashed + '.gz'), 'wb') as file:
+                # mtime=0, the same bundle always compresses to the same bytes
+                file.write(gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(os.path.join(dist, hashed + '.br'), 'wb') as file:
+                    file.write(brotli.compress(body, quality=11))
+        manifest[name] = hashed
+
+    with open(os.path.join(dist, MANIFEST), 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def asset_urls(name):
+    '''urls to link for the bundle `name`: its built file, or its sources'''
+    manifest = current_app.extensions['asset_manifest']
+    if manifest is not None and name in manifest:
+        return [url_for('asset', filename=manifest[name])]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+def send_asset(filename):
+    # a built file, precompressed if the client takes it
+    dist = os.path.join(current_app.static_folder, DIST)
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz'), (None, '')):
+        path = safe_join(dist, filename + suffix)
+        if (encoding is None or request.accept_encodings[encoding]) and \
+                path is not None and os.path.isfile(path):
+            break
+    else:
+        abort(404)
+    response = send_from_directory(dist, filename + suffix, mimetype=mimetype, max_age=MAX_AGE)
+    response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    # the name holds the content hash already
+    response.set_etag(f'{filename}{suffix}')
+    return response.make_conditional(request)
+
+
+def init_app(app):
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'asset', send_asset)
+    app.jinja_env.globals['asset_urls'] = asset_urls
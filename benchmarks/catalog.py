@@ -0,0 +1,160 @@
+'''
+Synthetic catalogs of venues, artists and shows, for the benchmarks.
+
+    from catalog import generate_catalog
+    sizes = generate_catalog(shows=100000)
+
+Rows are written with bulk inserts, stored counters and genre links included,
+so the result looks like a database the app has been running on. The same
+seed always gives the same catalog.
+'''
+import random
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import bindparam
+
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+from forms import VenueForm
+
+AREAS = (
+    ('New York', 'NY'), ('Brooklyn', 'NY'), ('Buffalo', 'NY'), ('San Francisco', 'CA'),
+    ('Los Angeles', 'CA'), ('Oakland', 'CA'), ('San Diego', 'CA'), ('Chicago', 'IL'),
+    ('Austin', 'TX'), ('Houston', 'TX'), ('Dallas', 'TX'), ('Nashville', 'TN'),
+    ('Memphis', 'TN'), ('Seattle', 'WA'), ('Portland', 'OR'), ('Denver', 'CO'),
+    ('Atlanta', 'GA'), ('Miami', 'FL'), ('New Orleans', 'LA'), ('Boston', 'MA'),
+    ('Philadelphia', 'PA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'), ('Phoenix', 'AZ'),
+)
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+
+VENUE_WORDS = ('Hall', 'Lounge', 'Room', 'Club', 'Theater', 'Garden', 'Cellar', 'Hop',
+               'Tavern', 'Stage', 'Barn', 'Ballroom')
+ARTIST_WORDS = ('Band', 'Trio', 'Quartet', 'Collective', 'Orchestra', 'Project', 'Sound',
+                'Brothers', 'Sisters', 'Ensemble')
+ADJECTIVES = ('Blue', 'Velvet', 'Electric', 'Golden', 'Wild', 'Silent', 'Crimson', 'Lucky',
+              'Midnight', 'Rusty', 'Musical', 'Neon', 'Hollow', 'Painted', 'Northern')
+
+CHUNK = 10000
+
+
+def _chunks(rows):
+    # `rows` may be a generator, only a chunk of it is held at a time
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, CHUNK))
+        if not chunk:
+            break
+        yield chunk
+
+
+def _insert(table, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(table.insert(), chunk)
+
+
+def _insert_linked(table, links_table, rows):
+    # `rows` of (row, its genre links)
+    for chunk in _chunks(rows):
+        db.session.execute(table.insert(), [row for row, _ in chunk])
+        db.session.execute(links_table.insert(), [link for _, links in chunk for link in links])
+
+
+def _genres(rng):
+    return rng.sample(GENRES, rng.randint(1, 3))
+
+
+def _owner(rng, count):
+    # a fifth of the shows go to a few popular venues/artists
+    if rng.random() < 0.2:
+        return min(int(rng.paretovariate(1.0)), count)
+    return rng.randint(1, count)
+
+
+def generate_catalog(shows, venues=None, artists=None, seed=0, now=None):
+    '''
+    writes a catalog with `shows` shows, a third of them upcoming, into the
+    app's (empty) database and returns the number of rows of each kind
+    '''
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    venues = venues or max(shows // 20, 10)
+    artists = artists or max(shows // 10, 10)
+
+    genre_ids = {name: number for number, name in enumerate(GENRES, 1)}
+    _insert(Genre.__table__, [{'id': number, 'name': name} for name, number in genre_ids.items()])
+
+    # rows are generated as they are inserted, a million shows and the
+    # venues and artists that go with them never sit in memory at once
+    def venue_rows():
+        for number in range(1, venues + 1):
+            city, state = rng.choice(AREAS)
+            genres = _genres(rng)
+            yield {
+                'id': number,
+                'name': f'The {rng.choice(ADJECTIVES)} {rng.choice(VENUE_WORDS)} {number}',
+                'city': city, 'state': state,
+                'address': f'{rng.randint(1, 2000)} {rng.choice(ADJECTIVES)} St',
+                'phone': f'{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}',
+                'genres': ', '.join(genres),
+                'image_link': f'https://images.example.com/venues/{number}.jpg',
+                'facebook_link': f'https://www.facebook.com/venue{number}',
+                'website_link': f'https://venue{number}.example.com',
+                'talent_search': rng.random() < 0.3,
+                'seeking_description': 'Looking for local acts.',
+            }, [{'venue_id': number, 'genre_id': genre_ids[name]} for name in genres]
+
+    def artist_rows():
+        for number in range(1, artists + 1):
+            city, state = rng.choice(AREAS)
+            genres = _genres(rng)
+            yield {
+                'id': number,
+                'name': f'{rng.choice(ADJECTIVES)} {rng.choice(ARTIST_WORDS)} {number}',
+                'city': city, 'state': state,
+                'phone': f'{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}',
+                'genres': ', '.join(genres),
+                'image_link': f'https://images.example.com/artists/{number}.jpg',
+                'facebook_link': f'https://www.facebook.com/artist{number}',
+                'website_link': f'https://artist{number}.example.com',
+                'venue_search': rng.random() < 0.3,
+                'description': 'Touring this year.',
+            }, [{'artist_id': number, 'genre_id': genre_ids[name]} for name in genres]
+
+    _insert_linked(Venue.__table__, venue_genres, venue_rows())
+    _insert_linked(Artist.__table__, artist_genres, artist_rows())
+
+    # the counters are totted up as the shows go in, and written after
+    counts = {Venue: [[0, 0] for _ in range(venues + 1)],
+              Artist: [[0, 0] for _ in range(artists + 1)]}
+
+    def show_rows():
+        for number in range(1, shows + 1):
+            venue_id, artist_id = _owner(rng, venues), _owner(rng, artists)
+            event_date = now + timedelta(minutes=rng.randint(-2 * 365 * 1440, 365 * 1440))
+            upcoming = event_date > now
+            counts[Venue][venue_id][upcoming] += 1
+            counts[Artist][artist_id][upcoming] += 1
+            yield {'id': number, 'venue_id': venue_id, 'artist_id': artist_id,
+                   'event_date': event_date, 'is_upcoming': upcoming}
+
+    _insert(Show.__table__, show_rows())
+
+    for model, model_counts in counts.items():
+        table = model.__table__
+        update = table.update().where(table.c.id == bindparam('owner_id')).values(
+            past_shows_count=bindparam('past'), upcoming_shows_count=bindparam('upcoming'))
+        for chunk in _chunks({'owner_id': number, 'past': past, 'upcoming': upcoming}
+                             for number, (past, upcoming) in enumerate(model_counts)
+                             if past or upcoming):
+            db.session.execute(update, chunk)
+    db.session.commit()
+
+    if db.engine.dialect.name == 'postgresql':
+        # ids were given explicitly, move the sequences past them
+        for model in (Genre, Venue, Artist, Show):
+            db.session.execute(
+                f'SELECT setval(pg_get_serial_sequence(\'"{model.__tablename__}"\', \'id\'), '
+                f'max(id)) FROM "{model.__tablename__}"')
+        db.session.commit()
+
+    return {'venues': venues, 'artists': artists, 'shows': shows}
@@ -0,0 +1,148 @@
+'''
+Query plans of the hot queries, without and with the indexes of migration
+c41a8e5d7f20.
+
+    python benchmarks/query_plans.py [--database-url URL] [--shows N] [--output plans.json]
+
+Runs against an in-memory SQLite database unless --database-url (or
+DATABASE_URL) points at a scratch Postgres database; its tables are created
+and seeded, so don't point it at real data.
+'''
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from sqlalchemy import func
+
+from app import create_app
+from models import db, Venue, Artist, Show
+
+
+# the indexes added by migration c41a8e5d7f20
+PLAN_INDEXES = (
+    'ix_Shows_venue_id_event_date',
+    'ix_Shows_artist_id_event_date',
+    'ix_Shows_event_date_id',
+    'ix_Venue_city_state',
+    'ix_Venue_lower_name',
+    'ix_Artist_lower_name',
+)
+
+
+def plan_indexes():
+    return [index for model in (Venue, Artist, Show)
+            for index in model.__table__.indexes if index.name in PLAN_INDEXES]
+
+
+def seed(shows):
+    venues = artists = max(shows // 20, 10)
+    now = datetime.now()
+    db.session.execute(Venue.__table__.insert(), [
+        {'name': f'Venue {i}', 'city': f'City {i % 50}', 'state': 'NY',
+         'talent_search': False} for i in range(venues)])
+    db.session.execute(Artist.__table__.insert(), [
+        {'name': f'Artist {i}', 'city': f'City {i % 50}', 'state': 'NY',
+         'venue_search': False} for i in range(artists)])
+    db.session.execute(Show.__table__.insert(), [
+        {'venue_id': random.randint(1, venues), 'artist_id': random.randint(1, artists),
+         'event_date': now + timedelta(hours=random.randint(-24 * 365, 24 * 365)),
+         'is_upcoming': False} for _ in range(shows)])
+    db.session.commit()
+
+
+def hot_queries():
+    now = datetime.now()
+    return {
+        'venue detail shows': db.session.query(Show, Artist).join(Artist).
+        filter(Show.venue_id == 1, Show.event_date > now),
+        'artist detail shows': db.session.query(Show, Venue).join(Venue).
+        filter(Show.artist_id == 1, Show.event_date > now),
+        'shows listing page': db.session.query(Show.id, Show.event_date).
+        filter(Show.event_date > now).order_by(Show.event_date, Show.id).limit(50),
+        'venues in an area': db.session.query(Venue.id, Venue.name).
+        filter(Venue.city == 'City 7', Venue.state == 'NY'),
+        'venue by name': db.session.query(Venue.id).
+        filter(func.lower(Venue.name) == 'venue 7'),
+        'artist by name': db.session.query(Artist.id).
+        filter(func.lower(Artist.name) == 'artist 7'),
+    }
+
+
+def explain(query):
+    connection = db.session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, params)
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN ' + compiled.string, params)
+    return [row[0] for row in rows]
+
+
+def analyze():
+    if db.engine.dialect.name == 'postgresql':
+        for model in (Venue, Artist, Show):
+            db.session.execute(f'ANALYZE "{model.__tablename__}"')
+    else:
+        db.session.execute('ANALYZE')
+
+
+def collect_plans():
+    plans = {}
+    for name, query in hot_queries().items():
+        plans[name] = explain(query)
+    db.session.rollback()
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL', 'sqlite://'))
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--output', help='write the plans as JSON to this file')
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url})
+    with app.app_context():
+        db.create_all()
+        seed(args.shows)
+
+        for index in plan_indexes():
+            index.drop(db.engine)
+        analyze()
+        before = collect_plans()
+
+        for index in plan_indexes():
+            index.create(db.engine)
+        analyze()
+        after = collect_plans()
+        database = db.engine.dialect.name
+
+    report = {
+        'database': database,
+        'shows': args.shows,
+        'queries': {name: {'before': before[name], 'after': after[name]} for name in before},
+    }
+
+    for name, plans in report['queries'].items():
+        print(f'== {name}')
+        for label in ('before', 'after'):
+            print(f'  {label}:')
+            for line in plans[label]:
+                print(f'    {line}')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
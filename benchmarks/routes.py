@@ -0,0 +1,249 @@
+'''
+Latency, queries per request and memory of every route, on a synthetic catalog.
+
+    python benchmarks/routes.py [--database-url URL] [--shows N] [--requests N]
+                                [--page-cache] [--output results.json] [--baseline old.json]
+
+Runs against an in-memory SQLite database unless --database-url (or
+DATABASE_URL) points at a scratch Postgres database; its tables are created
+and filled, so don't point it at real data. Write routes are included and add
+rows as they go; deleting is left out.
+
+With --baseline, routes whose p95 got more than --tolerance slower, or that
+issue more queries than in the baseline, are listed and the exit status is 1.
+'''
+import argparse
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import create_app
+from models import db
+from catalog import ADJECTIVES, GENRES, generate_catalog
+
+
+def routes(rng, sizes):
+    '''(name, method, url, form data) makers, one per route'''
+    def venue_id():
+        return rng.randint(1, sizes['venues'])
+
+    def artist_id():
+        return rng.randint(1, sizes['artists'])
+
+    def venue_form():
+        return {'name': f'Bench Venue {rng.random()}', 'city': 'New York', 'state': 'NY',
+                'address': '1 Bench St', 'phone': '555-555-5555',
+                'genres': rng.sample(GENRES, 2), 'facebook_link': '', 'image_link': '',
+                'website_link': '', 'seeking_description': ''}
+
+    def artist_form():
+        form = venue_form()
+        del form['address']
+        return form
+
+    # new shows a booking slot apart, past the catalog's, so none conflicts
+    slots = itertools.count()
+
+    def show_form():
+        start = datetime(2030, 1, 1, 20) + timedelta(hours=4 * next(slots))
+        return {'venue_id': str(venue_id()), 'artist_id': str(artist_id()),
+                'start_time': start.strftime('%Y-%m-%d %H:%M:%S')}
+
+    def month():
+        start = datetime.now().date() + timedelta(days=rng.randint(-365, 300))
+        return f'from={start.isoformat()}&to={(start + timedelta(days=30)).isoformat()}'
+
+    return [
+        ('home', 'get', lambda: '/', None),
+        ('venues', 'get', lambda: '/venues', None),
+        ('venues filtered', 'get', lambda: f'/venues?genre={rng.choice(GENRES)}&state=NY&upcoming=1', None),
+        ('venue detail', 'get', lambda: f'/venues/{venue_id()}', None),
+        ('venue search', 'post', lambda: '/venues/search', lambda: {'search_term': rng.choice(('hall', 'blue', 'the', 'jazz', 'ny'))}),
+        ('venue edit form', 'get', lambda: f'/venues/{venue_id()}/edit', None),
+        ('venue edit', 'post', lambda: f'/venues/{venue_id()}/edit', venue_form),
+        ('venue create form', 'get', lambda: '/venues/create', None),
+        ('venue create', 'post', lambda: '/venues/create', venue_form),
+        ('artists', 'get', lambda: '/artists', None),
+        ('artists filtered', 'get', lambda: f'/artists?genre={rng.choice(GENRES)}&city=Austin&state=TX', None),
+        ('artist detail', 'get', lambda: f'/artists/{artist_id()}', None),
+        ('artist search', 'post', lambda: '/artists/search', lambda: {'search_term': rng.choice(('band', 'wild', 'sound', 'rock', 'a'))}),
+        ('artist edit form', 'get', lambda: f'/artists/{artist_id()}/edit', None),
+        ('artist edit', 'post', lambda: f'/artists/{artist_id()}/edit', artist_form),
+        ('artist create form', 'get', lambda: '/artists/create', None),
+        ('artist create', 'post', lambda: '/artists/create', artist_form),
+        ('shows', 'get', lambda: '/shows', None),
+        ('upcoming shows', 'get', lambda: '/shows?upcoming=1', None),
+        ('show create form', 'get', lambda: '/shows/create', None),
+        ('month of shows', 'get', lambda: f'/shows?{month()}', None),
+        ('month at a venue', 'get', lambda: f'/shows?venue_id={venue_id()}&{month()}', None),
+        ('show create', 'post', lambda: '/shows/create', show_form),
+        ('api venues', 'get', lambda: '/api/v1/venues?fields=id,name,city,state', None),
+        ('api venue', 'get', lambda: f'/api/v1/venues/{venue_id()}', None),
+        ('api artists', 'get', lambda: '/api/v1/artists', None),
+        ('api artist', 'get', lambda: f'/api/v1/artists/{artist_id()}', None),
+        ('api shows', 'get', lambda: '/api/v1/shows?upcoming=1', None),
+        ('api show', 'get', lambda: f'/api/v1/shows/{rng.randint(1, sizes["shows"])}', None),
+        ('typeahead', 'get', lambda: f'/api/v1/artists/typeahead?q={rng.choice(ADJECTIVES)[:rng.randint(1, 4)]}', None),
+        ('export venues', 'get', lambda: '/export/venues.jsonl', None),
+        ('cache stats', 'get', lambda: '/cache/stats', None),
+        ('metrics', 'get', lambda: '/metrics', None),
+    ]
+
+
+def percentile(ordered, fraction):
+    # nearest rank
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'after_cursor_execute', self)
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def request(client, method, url, data):
+    response = getattr(client, method)(url(), data=data() if data else None)
+    response.get_data()  # drain streamed bodies
+    return response.status_code
+
+
+def measure(client, counter, route, count, warmup):
+    name, method, url, data = route
+    for _ in range(warmup):
+        request(client, method, url, data)
+
+    timings, statuses = [], set()
+    counter.count = 0
+    for _ in range(count):
+        started = time.perf_counter()
+        statuses.add(request(client, method, url, data))
+        timings.append(time.perf_counter() - started)
+    queries = counter.count / count
+
+    # memory apart, tracemalloc slows everything down
+    tracemalloc.start()
+    request(client, method, url, data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'requests': count,
+        'status': sorted(statuses),
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'mean_ms': sum(timings) / count * 1000,
+        'queries_per_request': queries,
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for name, result in report['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append(f'{name}: p95 {before["p95_ms"]:.1f} -> {result["p95_ms"]:.1f} ms')
+        if result['queries_per_request'] > before['queries_per_request']:
+            found.append(f'{name}: queries {before["queries_per_request"]:g} -> '
+                         f'{result["queries_per_request"]:g}')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL', 'sqlite://'))
+    parser.add_argument('--shows', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--page-cache', action='store_true', help='leave the page cache on')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='p95 slowdown tolerated against the baseline, 0.2 = 20%%')
+    args = parser.parse_args()
+
+    app = create_app({
+        # debug mode records every statement with its parameters, a million
+        # show rows included, and reloads templates
+        'DEBUG': False,
+        'SQLALCHEMY_DATABASE_URI': args.database_url,
+        'SQLALCHEMY_BINDS': {},
+        'WTF_CSRF_ENABLED': False,
+        'PAGE_CACHE_ENABLED': args.page_cache,
+        'QUERY_BUDGET': 'off',
+    })
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        sizes = generate_catalog(args.shows, seed=args.seed)
+        generated_in = time.perf_counter() - started
+        database = db.engine.dialect.name
+
+    counter = QueryCounter()
+    client = app.test_client()
+    results = {}
+    for route in routes(rng, sizes):
+        results[route[0]] = measure(client, counter, route, args.requests, args.warmup)
+
+    report = {
+        'commit': git_commit(),
+        'database': database,
+        'catalog': sizes,
+        'catalog_seconds': generated_in,
+        'page_cache': args.page_cache,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'routes': results,
+    }
+
+    print(f'{database}, {sizes["shows"]} shows, {sizes["venues"]} venues, '
+          f'{sizes["artists"]} artists (generated in {generated_in:.1f}s)')
+    print(f'{"route":<20} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"peak kB":>9}')
+    for name, result in results.items():
+        print(f'{name:<20} {result["p50_ms"]:8.2f} {result["p95_ms"]:8.2f} {result["p99_ms"]:8.2f} '
+              f'{result["queries_per_request"]:8.2f} {result["peak_memory_kb"]:9.0f}')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            found = regressions(report, json.load(baseline), args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+'''
+Cold start of a worker: importing the app, building it and serving a first request.
+
+    python benchmarks/startup.py [--runs N] [--compare REV] [--output results.json]
+
+Every run is a fresh interpreter, as a new dyno or a restarted worker would
+be, and the median of --runs is reported. With --compare, the tree of that git
+revision (e.g. HEAD~1) is measured the same way, next to the working tree.
+Apps built at import time (a module level `app`) are measured too, so older
+revisions compare. The first request is to the home page, which touches no
+database; it is served against in-memory SQLite.
+'''
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# run in the child interpreter, from the tree being measured
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+if hasattr(module, 'create_app'):
+    app = module.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'SQLALCHEMY_BINDS': {}})
+else:
+    app = module.app
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_BINDS={})
+built = time.perf_counter()
+status = app.test_client().get('/').status_code
+served = time.perf_counter()
+json.dump({'import': imported - started, 'create': built - imported,
+           'first_request': served - built, 'status': status,
+           'modules': len(sys.modules)}, sys.stdout)
+'''
+
+
+def measure_once(tree):
+    env = dict(os.environ, SECRET_KEY='startup-benchmark')
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=tree, env=env,
+                            capture_output=True, text=True)
+    total = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f'{tree}: the app failed to start\n{result.stderr}')
+    timings = json.loads(result.stdout)
+    timings['process'] = total
+    return timings
+
+
+def measure(tree, runs):
+    measure_once(tree)  # writes the bytecode caches, as a deployed build has them
+    samples = [measure_once(tree) for _ in range(runs)]
+    report = {name: statistics.median(sample[name] for sample in samples) * 1000
+              for name in ('import', 'create', 'first_request', 'process')}
+    report['modules'] = samples[-1]['modules']
+    report['status'] = samples[-1]['status']
+    return report
+
+
+def export_revision(revision, directory):
+    archive = subprocess.run(['git', 'archive', '--format=tar', revision], cwd=ROOT,
+                             capture_output=True, check=True).stdout
+    path = os.path.join(directory, 'archive.tar')
+    with open(path, 'wb') as output:
+        output.write(archive)
+    with tarfile.open(path) as tar:
+        tar.extractall(directory)
+    os.remove(path)
+
+
+def print_report(name, report):
+    print(f'{name:<16} {report["import"]:9.0f} {report["create"]:9.0f} '
+          f'{report["first_request"]:9.0f} {report["process"]:9.0f} {report["modules"]:8d}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--compare', metavar='REV', help='git revision to measure as well')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {'working tree': measure(ROOT, args.runs)}
+    if args.compare:
+        directory = tempfile.mkdtemp(prefix='fyyur-startup-')
+        try:
+            export_revision(args.compare, directory)
+            results[args.compare] = measure(directory, args.runs)
+        finally:
+            shutil.rmtree(directory)
+
+    print(f'median of {args.runs} runs, in ms')
+    print(f'{"tree":<16} {"import":>9} {"create":>9} {"1st req":>9} {"process":>9} {"modules":>8}')
+    for name, report in results.items():
+        print_report(name, report)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
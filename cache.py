@@ -0,0 +1,196 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+# Page cache with tag based invalidation.
+# Every cached page is stored with the tags of the rows it shows ('venue:7',
+# 'artists', ...). A write handler invalidates the tags of the rows it touched,
+# which evicts exactly the pages that displayed them.
+#
+# MemoryCache lives inside one process, so with several workers use
+# SharedCache, backed by a store all workers can reach.
+#
+# Callers take a token with `begin()` before building a page and hand it to
+# `set()`: a page built while some invalidation ran may be stale and is not
+# stored.
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemoryCache:
+    '''in-process LRU cache whose entries expire after `ttl` seconds'''
+
+    # invalidations reach this process only
+    shared = False
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()  # key -> (expires, value, tags)
+        self._tagged = {}  # tag -> keys
+        self._generation = 0  # bumped by every invalidation
+        self._lock = threading.Lock()
+
+    def begin(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=(), token=None):
+        with self._lock:
+            if token is not None and token != self._generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, frozenset(tags))
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+            self.stats.invalidations += 1
+            for tag in tags:
+                for key in self._tagged.pop(tag, ()):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+
+class LocalStore:
+    '''
+    Stand-in for a shared key-value store such as Redis or memcached, for
+    local runs and tests. SharedCache only needs `get`, `set` with a ttl and
+    an atomic `incr`.
+    '''
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            expires = time.monotonic() + ttl if ttl else None
+            self._data[key] = (expires, value)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._data.get(key, (None, 0))[1]) + 1
+            self._data[key] = (None, value)
+            return value
+
+    def flushall(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedCache:
+    '''
+    Cache kept in a store shared by all workers. Tags are versioned: an entry
+    remembers the version of each of its tags and is stale once any of them
+    has been bumped, so invalidation is one atomic `incr` per tag.
+    '''
+
+    def __init__(self, store, ttl=300, prefix='fyyur:page:'):
+        self.store = store
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+        # a LocalStore is as private to the process as a MemoryCache
+        self.shared = not isinstance(store, LocalStore)
+
+    def _tag_key(self, tag):
+        return f'{self.prefix}tag:{tag}'
+
+    def _tag_version(self, tag):
+        return int(self.store.get(self._tag_key(tag)) or 0)
+
+    def begin(self):
+        return self._tag_version('*')
+
+    def get(self, key):
+        raw = self.store.get(self.prefix + key)
+        if raw is not None:
+            value, versions = pickle.loads(raw)
+            if all(self._tag_version(tag) == version for tag, version in versions.items()):
+                self.stats.hits += 1
+                return value
+        self.stats.misses += 1
+        return None
+
+    def set(self, key, value, tags=(), token=None):
+        versions = {tag: self._tag_version(tag) for tag in tags}
+        if token is not None and token != self.begin():
+            return
+        self.store.set(self.prefix + key, pickle.dumps((value, versions)), self.ttl)
+
+    def invalidate(self, *tags):
+        self.stats.invalidations += 1
+        # '*' first: a concurrent set() then either sees it and skips, or
+        # stores versions that the tag bumps below make stale
+        self.store.incr(self._tag_key('*'))
+        for tag in tags:
+            self.store.incr(self._tag_key(tag))
+
+    def clear(self):
+        self.store.flushall()
+
+
+def create_cache(config, store=None):
+    '''builds the page cache described by the PAGE_CACHE_* settings'''
+    if config['PAGE_CACHE_BACKEND'] == 'shared':
+        return SharedCache(store or LocalStore(), ttl=config['PAGE_CACHE_TTL'])
+    return MemoryCache(max_entries=config['PAGE_CACHE_SIZE'], ttl=config['PAGE_CACHE_TTL'])
@@ -0,0 +1,154 @@
+from collections import Counter
+from datetime import datetime
+
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import bindparam
+from sqlalchemy.exc import SQLAlchemyError
+
+import exporter
+from helpers import page_cache
+from models import db, Venue, Artist, Show, ENTITY_MODELS, export_columns, link_genres, past_due_shows, \
+    roll_over_shows
+
+# importer (and dateutil with it) is imported by the import command only
+
+bp = Blueprint('commands', __name__, cli_group=None)
+
+
+#  Commands
+#  ----------------------------------------------------------------
+
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    '''Bundles, fingerprints and precompresses the CSS and JS into static/dist.'''
+    import assets
+    manifest = assets.build(current_app.static_folder)
+    for name, hashed in manifest.items():
+        click.echo(f'{name} -> {assets.DIST}/{hashed}')
+    if assets.brotli is None:
+        click.echo('brotli is not installed, only gzip variants were written', err=True)
+
+
+def invalidate_pages(*tags):
+    # a command runs in its own process: unless the page cache is shared,
+    # the web workers keep serving their copies until PAGE_CACHE_TTL
+    page_cache.invalidate(*tags)
+    if not page_cache.shared:
+        click.echo('the page cache is not shared, cached pages may stay stale for up to '
+                   f'{current_app.config["PAGE_CACHE_TTL"]} seconds', err=True)
+
+
+@bp.cli.command('rollover-shows')
+def rollover_shows_command():
+    '''
+    Moves shows that have taken place from upcoming to past counts.
+
+    Cached pages of the venues and artists affected are invalidated if the
+    page cache is shared; otherwise they may be stale for up to PAGE_CACHE_TTL.
+    '''
+    # meant to run periodically, e.g. from cron or the Heroku scheduler
+    now = datetime.now()
+    owners = db.session.query(Show.venue_id, Show.artist_id).\
+        filter(past_due_shows(now)).distinct().all()
+    click.echo(f'{roll_over_shows(now)} shows rolled over')
+    # the ?upcoming=1 listings filter on the counters
+    invalidate_pages('shows', 'venues', 'artists',
+                     *{f'venue:{venue_id}' for venue_id, _ in owners},
+                     *{f'artist:{artist_id}' for _, artist_id in owners})
+
+
+def count_imported_shows(shows, touched):
+    # bulk inserts skip the Show events, so bump the counters per chunk here
+    for model, owner, tag in ((Venue, 'venue_id', 'venue'), (Artist, 'artist_id', 'artist')):
+        table = model.__table__
+        counts = Counter((show[owner], show['is_upcoming']) for show in shows)
+        for upcoming, counter in ((True, 'upcoming_shows_count'), (False, 'past_shows_count')):
+            column = table.c[counter]
+            params = [{'owner_id': owner_id, 'added': added}
+                      for (owner_id, is_upcoming), added in counts.items() if is_upcoming is upcoming]
+            if params:
+                db.session.execute(table.update().
+                                   where(table.c.id == bindparam('owner_id')).
+                                   values({column: column + bindparam('added')}), params)
+        touched.update(f'{tag}:{owner_id}' for owner_id, _ in counts)
+
+
+@bp.cli.command('import')
+@click.argument('entity', type=click.Choice(list(ENTITY_MODELS)))
+@click.argument('filename', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='File format, guessed from the extension by default.')
+@click.option('--chunk-size', type=int, help='Rows written and committed per batch.')
+def import_command(entity, filename, fmt, chunk_size):
+    '''
+    Bulk loads venues, artists or shows from a CSV or JSON Lines file.
+
+    Cached pages showing the imported rows are invalidated if the page cache
+    is shared; otherwise they may be stale for up to PAGE_CACHE_TTL.
+    '''
+    import importer
+    table = ENTITY_MODELS[entity].__table__
+    chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+    now = datetime.now()
+    touched = {entity}
+
+    def classify(show):
+        show['is_upcoming'] = show.get('event_date') is not None and show['event_date'] > now
+
+    def report(stats):
+        click.echo(f'{entity}: {stats.imported} imported, {stats.rejected} rejected '
+                   f'({stats.rate:.0f} rows/s)', err=True)
+
+    options = {}
+    if entity == 'shows':
+        options = {
+            'aliases': {'start_time': 'event_date'},
+            'prepare': classify,
+            'after_chunk': lambda shows: count_imported_shows(shows, touched),
+        }
+        # upcoming counts change, so do the ?upcoming=1 listings
+        touched.update(('venues', 'artists'))
+
+    try:
+        with open(filename, newline='') as stream:
+            records = importer.read_records(stream, fmt or importer.detect_format(filename))
+            stats = importer.import_records(db.session, table, records, chunk_size,
+                                            report=report, **options)
+        if entity != 'shows':
+            link_genres(ENTITY_MODELS[entity], chunk_size)
+    except importer.ImportDataError as error:
+        db.session.rollback()
+        raise click.ClickException(str(error))
+    except SQLAlchemyError as error:
+        # chunks committed before the failing one stay imported
+        db.session.rollback()
+        raise click.ClickException(f'import stopped: {getattr(error, "orig", error)}')
+
+    invalidate_pages(*touched)
+    for number, reason in stats.rejections:
+        click.echo(f'  record {number} rejected: {reason}', err=True)
+    click.echo(f'{entity}: {stats.imported} rows imported, {stats.rejected} rejected')
+
+
+def parse_since(ctx, param, value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        raise click.BadParameter('expected an ISO date or datetime, e.g. 2026-10-01T00:00:00')
+
+
+@bp.cli.command('export')
+@click.argument('entity', type=click.Choice(list(ENTITY_MODELS)))
+@click.option('--format', 'fmt', type=click.Choice(list(exporter.FORMATS)), default='jsonl')
+@click.option('--since', callback=parse_since, help='Only rows created after this ISO datetime.')
+@click.option('--output', type=click.File('w'), default='-', help='File to write, stdout by default.')
+@click.option('--chunk-size', type=int, help='Rows fetched and written per batch.')
+def export_command(entity, fmt, since, output, chunk_size):
+    '''Streams venues, artists or shows out as JSON Lines or CSV.'''
+    model = ENTITY_MODELS[entity]
+    chunks = exporter.export_chunks(db.session, model.__table__, export_columns(model), fmt,
+                                    since=since, chunk_size=chunk_size or current_app.config['EXPORT_CHUNK_SIZE'])
+    for chunk in chunks:
+        output.write(chunk)
@@ -0,0 +1,105 @@
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+# Compression of the app's dynamic responses (pages, JSON, exports), in the
+# encoding the client prefers of brotli and gzip.
+# A response built whole is compressed when it is at least COMPRESS_MIN_SIZE
+# bytes, below that the encoding saves less than it costs. A streamed one is
+# compressed chunk by chunk, each chunk flushed so the browser can render it
+# as soon as it arrives. Built assets are precompressed (assets.py) and sent
+# as they are.
+
+COMPRESSIBLE = {
+    'text/html', 'text/plain', 'text/css', 'text/csv',
+    'application/json', 'application/javascript', 'application/x-ndjson',
+}
+
+
+def choose_encoding(accept_encodings):
+    # the client's preferred encoding of those available, None for identity
+    offered = ['gzip'] if brotli is None else ['br', 'gzip']
+    encoding = accept_encodings.best_match(offered)
+    return encoding if encoding is not None and accept_encodings[encoding] else None
+
+
+class _Gzip:
+    def __init__(self, level):
+        # wbits 16 + MAX_WBITS writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+COMPRESSORS = {'gzip': _Gzip, 'br': _Brotli}
+
+
+def _compressed_stream(chunks, compressor, charset):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            if chunk:
+                yield compressor.compress(chunk)
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    # after_request hook
+    config = current_app.config
+    if not config['COMPRESS_ENABLED'] or response.direct_passthrough or \
+            response.status_code < 200 or response.status_code >= 300 or \
+            response.status_code == 204 or 'Content-Encoding' in response.headers or \
+            response.mimetype not in COMPRESSIBLE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compressed_stream(
+            response.response, COMPRESSORS[encoding](config['COMPRESS_LEVEL']), response.charset)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            return response
+        compressor = COMPRESSORS[encoding](config['COMPRESS_LEVEL'])
+        response.set_data(compressor.compress(body) + compressor.finish())
+
+    response.content_encoding = encoding
+    # a strong validator names one representation, each encoding gets its own
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
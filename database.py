@@ -0,0 +1,100 @@
+import os
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+
+
+# Engine configuration and read replica routing.
+# Server databases get their pool settings from the DB_* config values. When
+# SQLALCHEMY_BINDS has a 'replica' entry, views decorated with replica_reads
+# run their queries there; everything else, any flush, and every request of a
+# client that wrote in the last REPLICA_STICKY_SECONDS use the primary.
+
+REPLICA = 'replica'
+
+
+def _sqlite_file(sa_url):
+    return sa_url.drivername.startswith('sqlite') and sa_url.database not in (None, '', ':memory:')
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_app_context() and g.get('use_replica') and not self._flushing \
+                and not (self.new or self.dirty or self.deleted):
+            return self.db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        # the base class rewrites file URLs in place, which SQLAlchemy 1.4 URLs
+        # don't allow; create_engine() makes their path absolute instead
+        if _sqlite_file(sa_url):
+            return
+        super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith('sqlite'):
+            return  # in memory, on the StaticPool set above
+
+        options.update(
+            pool_size=app.config['DB_POOL_SIZE'],
+            max_overflow=app.config['DB_MAX_OVERFLOW'],
+            pool_pre_ping=app.config['DB_POOL_PRE_PING'],
+            pool_recycle=app.config['DB_POOL_RECYCLE'],
+        )
+        timeout = app.config['DB_STATEMENT_TIMEOUT']
+        if timeout and sa_url.drivername.startswith('postgresql'):
+            options.setdefault('connect_args', {})['options'] = f'-c statement_timeout={timeout}'
+
+    def create_engine(self, sa_url, engine_opts):
+        if _sqlite_file(sa_url):
+            sa_url = sa_url.set(database=os.path.join(self.get_app().root_path, sa_url.database))
+        engine = super().create_engine(sa_url, engine_opts)
+        if sa_url.drivername.startswith('sqlite'):
+            # SQLite ignores foreign keys, ON DELETE CASCADE included, unless asked
+            event.listen(engine, 'connect', _enable_foreign_keys)
+        return engine
+
+
+def _enable_foreign_keys(connection, record):
+    cursor = connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+def has_replica():
+    return REPLICA in (current_app.config['SQLALCHEMY_BINDS'] or {})
+
+
+def reads_from_replica():
+    # whether this request's reads may go to the replica: there is one, and
+    # the client hasn't written recently
+    return has_replica() and session.get('primary_until', 0) < time.time()
+
+
+def replica_reads(view):
+    # runs a read-only view against the replica, unless the client wrote recently
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        g.use_replica = reads_from_replica()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def stick_to_primary(response):
+    # after_request hook: a client that just wrote keeps reading from the
+    # primary for a while, so replica lag never hides its own writes
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and not g.get('read_only') \
+            and has_replica():
+        session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+
+# Streaming export of whole tables as JSON Lines or CSV.
+# Rows come off a server-side cursor (stream_results) one partition at a time
+# and each partition is serialized into a single text chunk, so memory use is
+# bounded by the chunk size, whatever the size of the table.
+
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def export_partitions(session, table, columns, since=None, chunk_size=1000):
+    '''yields lists of rows of `table`, oldest id first, optionally only those
+    created after `since`'''
+    query = select(*[table.c[name] for name in columns]).order_by(table.c.id)
+    if since is not None:
+        query = query.where(table.c.created_at > since)
+
+    result = session.execute(query, execution_options={'stream_results': True})
+    try:
+        yield from result.partitions(chunk_size)
+    finally:
+        result.close()
+
+
+def jsonl_chunks(columns, partitions):
+    for rows in partitions:
+        yield ''.join(
+            json.dumps({name: _plain(value) for name, value in zip(columns, row)}) + '\n'
+            for row in rows)
+
+
+def csv_chunks(columns, partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header of an empty export
+        yield buffer.getvalue()
+
+
+def export_chunks(session, table, columns, fmt, since=None, chunk_size=1000):
+    '''yields the export of `table` in `fmt` as text chunks'''
+    partitions = export_partitions(session, table, columns, since, chunk_size)
+    if fmt == 'csv':
+        return csv_chunks(columns, partitions)
+    return jsonl_chunks(columns, partitions)
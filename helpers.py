@@ -0,0 +1,332 @@
+from datetime import datetime
+from functools import lru_cache, wraps
+
+from flask import Response, abort, current_app, g, get_flashed_messages, make_response, render_template, \
+    request, session, stream_with_context, url_for
+from werkzeug.local import LocalProxy
+
+from models import db, Venue, Artist, Show, Genre, ENTITY_MODELS, GENRE_LINKS, SHOW_FIELDS, split_genres
+from pagination import DeferredKeysetPage, keyset_query, clamp_page_size
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+
+# babel and dateutil are imported on the first formatted date rather than at
+# startup, they take a good part of a cold start and most requests don't need them
+
+@lru_cache(maxsize=None)
+def _datetime_patterns():
+    # babel patterns of the named formats, compiled once
+    import babel.dates
+    return babel.Locale.parse('en'), {
+        'full': babel.dates.parse_pattern("EEEE MMMM, d, y 'at' h:mma"),
+        'medium': babel.dates.parse_pattern("EE MM, dd, y h:mma"),
+    }
+
+
+@lru_cache(maxsize=4096)
+def _format_datetime(date, format, locale):
+    import babel.dates
+    default_locale, patterns = _datetime_patterns()
+    pattern = patterns.get(format)
+    if pattern is not None and locale in (None, default_locale):
+        return pattern.apply(date, default_locale)
+    return babel.dates.format_datetime(date, pattern.pattern if pattern else format,
+                                       locale=locale or default_locale)
+
+
+def format_datetime(value, format='medium', locale=None):
+    # views pass datetimes straight through; strings are still accepted
+    if isinstance(value, str):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return _format_datetime(value, format, locale)
+
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+
+def paginate(query, keys, key_of):
+    # keyset pagination driven by the ?after=, ?before= and ?per_page= args;
+    # the cursor is checked here, the rows are fetched when first used
+    per_page = clamp_page_size(request.args.get('per_page'),
+                               current_app.config['PAGE_SIZE'], current_app.config['MAX_PAGE_SIZE'])
+    after, before = request.args.get('after'), request.args.get('before')
+    try:
+        query = keyset_query(query, keys, per_page, after=after, before=before)
+    except ValueError:
+        abort(400)
+    return DeferredKeysetPage(query, key_of, per_page, after=after, before=before)
+
+
+def page_url(**cursor):
+    # url of the current listing with the page cursor swapped out, other args
+    # kept, repeated ones (?genre=Jazz&genre=Blues) included
+    args = request.args.to_dict(flat=False)
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update(cursor)
+    return url_for(request.endpoint, **request.view_args, **args)
+
+
+
+# the app's page cache, built by create_app()
+page_cache = LocalProxy(lambda: current_app.extensions['page_cache'])
+
+
+# the app's venue and artist name typeahead, see typeahead.py
+name_index = LocalProxy(lambda: current_app.extensions['name_index'])
+
+
+def load_names(entity):
+    # rows of the typeahead index of venues or artists
+    model = ENTITY_MODELS[entity]
+    return db.session.query(model.id, model.name, model.city, model.state).all()
+
+
+def page_cache_key():
+    # cache key of the requested page, None if it mustn't be cached;
+    # pages carrying flashed messages are per user
+    if not current_app.config['PAGE_CACHE_ENABLED'] or '_flashes' in session:
+        return None
+    return request.full_path
+
+
+def cached_response(key):
+    body = page_cache.get(key)
+    return Response(body, mimetype='text/html') if body is not None else None
+
+
+def begin_page():
+    g.cache_tags = set()
+    return page_cache.begin()
+
+
+def store_page(key, response, token):
+    if response.status_code != 200:
+        return response
+    if not response.is_streamed:
+        page_cache.set(key, response.get_data(), g.cache_tags, token)
+        return response
+    # a streamed page is stored once it has been sent whole; the tags are
+    # added to as the rows go out
+    response.response = _stored_stream(response.response, page_cache._get_current_object(),
+                                       key, g.cache_tags, token)
+    return response
+
+
+def _stored_stream(chunks, cache, key, tags, token):
+    body = []
+    try:
+        for chunk in chunks:
+            body.append(chunk)
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    # not reached if the client went away halfway
+    cache.set(key, b''.join(body), tags, token)
+
+
+def cached_page(view):
+    # serves GET pages from page_cache; the view tags what it shows with cache_tags()
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = page_cache_key()
+        if key is None:
+            return view(*args, **kwargs)
+
+        response = cached_response(key)
+        if response is not None:
+            return response
+        token = begin_page()
+        return store_page(key, make_response(view(*args, **kwargs)), token)
+    return wrapper
+
+
+# List pages are streamed: the layout down to the page's content goes out
+# first, while the rows are still being fetched, then the rows as they are
+# rendered, in chunks of STREAM_CHUNK_SIZE bytes. The views pass their rows as
+# generators over a paginate() page, so nothing is queried before the template
+# gets to the listing.
+
+# where the layout sends the head of every streamed page off right away
+STREAM_FLUSH = '<!-- flush -->'
+
+
+def _html_chunks(pieces, size):
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size or STREAM_FLUSH in piece:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def stream_page(template_name, **context):
+    '''
+    render_template(), sent as the template renders; the request context stays
+    available to the template and to the generators it consumes
+    '''
+    app = current_app._get_current_object()
+    # the session is saved before the body is sent; flashed messages are
+    # taken off it now, the template gets them from the request
+    get_flashed_messages()
+    app.update_template_context(context)
+    pieces = app.jinja_env.get_or_select_template(template_name).generate(context)
+    return Response(stream_with_context(_html_chunks(pieces, app.config['STREAM_CHUNK_SIZE'])),
+                    mimetype='text/html')
+
+
+def cache_tags(*tags):
+    # tags: 'venues'/'artists'/'shows' for listings, 'venue:<id>'/'artist:<id>' for rows
+    if 'cache_tags' in g:
+        g.cache_tags.update(tags)
+
+
+def listing_filters(model):
+    '''
+    Filters for venue and artist listings and searches from the request's
+    ?genre= (repeatable, all must match), ?city=, ?state= and ?upcoming=1.
+    Each one is served by an index: the genre links, (city, state) and the
+    stored upcoming show counter.
+    '''
+    args = request.values
+    filters = []
+    owner = GENRE_LINKS[model]
+    for name in args.getlist('genre'):
+        filters.append(model.id.in_(
+            db.session.query(owner).select_from(owner.table).
+            join(Genre, Genre.id == owner.table.c.genre_id).
+            filter(Genre.name == name)))
+    for arg in ('city', 'state'):
+        if args.get(arg):
+            filters.append(getattr(model, arg) == args[arg])
+    if args.get('upcoming', type=int) == 1:
+        filters.append(model.upcoming_shows_count > 0)
+    return filters
+
+
+def show_filters():
+    '''
+    Filters for show listings from the request's ?from= and ?to= (ISO dates
+    or datetimes; from included, to not), ?venue_id= and ?artist_id=. A time
+    range is served by the (event_date, id) index, a venue's or artist's
+    shows by its (venue_id or artist_id, event_date) one. Raises ValueError
+    on an argument that doesn't parse.
+    '''
+    args = request.args
+    filters = []
+    if args.get('from'):
+        filters.append(Show.event_date >= datetime.fromisoformat(args['from']))
+    if args.get('to'):
+        filters.append(Show.event_date < datetime.fromisoformat(args['to']))
+    for arg in ('venue_id', 'artist_id'):
+        if args.get(arg):
+            filters.append(getattr(Show, arg) == int(args[arg]))
+    return filters
+
+
+def show_listing_query(fields, upcoming_only=False):
+    # shows joined to their venue and artist, projected to the SHOW_FIELDS named
+    show_qs = db.session.query(*[SHOW_FIELDS[name].label(name) for name in fields]).\
+        select_from(Show).\
+        join(Venue, Show.venue_id == Venue.id).\
+        join(Artist, Show.artist_id == Artist.id)
+    if upcoming_only:
+        show_qs = show_qs.filter(Show.event_date > datetime.now())
+    return show_qs
+
+
+def split_shows(show_qs):
+    # one pass over shows ordered by date, split on a single timestamp
+    past_shows, upcoming_shows = [], []
+    now = datetime.now()
+    for show in show_qs:
+        (upcoming_shows if show.start_time > now else past_shows).append(show._asdict())
+    return past_shows, upcoming_shows
+
+
+def venue_shows_query(venue_id):
+    return db.session.query(
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.event_date.label('start_time'),
+    ).join(Artist, Show.artist_id == Artist.id).\
+        filter(Show.venue_id == venue_id, Show.event_date.isnot(None)).\
+        order_by(Show.event_date)
+
+
+def artist_shows_query(artist_id):
+    return db.session.query(
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Show.event_date.label('start_time'),
+    ).join(Venue, Show.venue_id == Venue.id).\
+        filter(Show.artist_id == artist_id, Show.event_date.isnot(None)).\
+        order_by(Show.event_date)
+
+
+# The detail pages are built from the entity and its show rows, fetched one
+# after the other by the views below or concurrently by the async mode (asgi.py).
+
+def venue_page(venue, show_rows):
+    cache_tags(f'venue:{venue.id}')
+
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": split_genres(venue.genres),
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "image_link": venue.image_link,
+        "seeking_talent": venue.talent_search,
+        "seeking_description": venue.seeking_description,
+    }
+
+    data['past_shows'], data['upcoming_shows'] = split_shows(show_rows)
+    data['past_shows_count'] = len(data['past_shows'])
+    data['upcoming_shows_count'] = len(data['upcoming_shows'])
+    cache_tags(*[f'artist:{show["artist_id"]}'
+                 for show in data['past_shows'] + data['upcoming_shows']])
+
+    return render_template('pages/show_venue.html', venue=data)
+
+
+def artist_page(artist, show_rows):
+    cache_tags(f'artist:{artist.id}')
+
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": split_genres(artist.genres),
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "image_link": artist.image_link,
+        "seeking_venue": artist.venue_search,
+        "seeking_description": artist.description,
+    }
+
+    data['past_shows'], data['upcoming_shows'] = split_shows(show_rows)
+    data['past_shows_count'] = len(data['past_shows'])
+    data['upcoming_shows_count'] = len(data['upcoming_shows'])
+    cache_tags(*[f'venue:{show["venue_id"]}'
+                 for show in data['past_shows'] + data['upcoming_shows']])
+
+    return render_template('pages/show_artist.html', artist=data)
@@ -0,0 +1,362 @@
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from functools import lru_cache, partial
+
+from flask import abort, current_app, redirect, request, send_file, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+
+
+# Image proxy for the venue and artist pictures.
+# Pages link an image_link through thumbnail_url(link, width), which points
+# at /images/<width>/<token>, the token being the link signed with the
+# SECRET_KEY: the proxy only ever fetches links the app put on a page itself.
+# The first request for a link fetches it once and writes a thumbnail for
+# each of IMAGE_WIDTHS (never wider than the original) to IMAGE_CACHE_DIR;
+# from then on the thumbnails are served from disk with a one year lifetime.
+# The directory is kept under IMAGE_CACHE_MAX_BYTES by removing the files
+# served least recently, and can be shared by the workers of a host.
+#
+# A link that can't be fetched or isn't an image is redirected to, as it was
+# linked before, and not tried again for IMAGE_RETRY_AFTER seconds.
+#
+# Fetching is done by a callable taking the link and returning its bytes:
+# fetch_image() over http(s) unless IMAGE_FETCHER names another, e.g. one
+# reading from a local stand-in server or fixture files. Links are typed in
+# by users, so fetch_image() only connects to public addresses: never to
+# loopback, private, link-local (cloud metadata) or reserved ones, checked
+# on the addresses it actually connects to, redirects included. Pillow is
+# imported on the first thumbnail; without it the originals are cached and
+# served as they are.
+
+log = logging.getLogger(__name__)
+
+MAX_AGE = 365 * 24 * 3600
+# a served file's mtime is refreshed at most this often, it orders evictions
+TOUCH_INTERVAL = 3600
+# links that failed, remembered until their retry time, at most this many
+MAX_FAILED = 4096
+
+SIGNATURES = {
+    b'\xff\xd8\xff': 'image/jpeg',
+    b'\x89PNG\r\n\x1a\n': 'image/png',
+    b'GIF87a': 'image/gif',
+    b'GIF89a': 'image/gif',
+}
+
+
+def sniff_mimetype(head):
+    # what the first bytes of a file say it is, None if not an image we serve
+    for signature, mimetype in SIGNATURES.items():
+        if head.startswith(signature):
+            return mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def _public_address(address):
+    # False for loopback, private, link-local, reserved and multicast addresses
+    address = ipaddress.ip_address(address.split('%')[0])
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def _public_connection(address, timeout=None, source_address=None):
+    # socket.create_connection(), connecting only if every address the host
+    # resolves to is public; the checked addresses are the ones connected
+    # to, a second lookup can't swap in another
+    host, port = address
+    infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    for *_, sockaddr in infos:
+        if not _public_address(sockaddr[0]):
+            raise ValueError(f'{host} is not a public address ({sockaddr[0]})')
+    error = None
+    for family, type_, proto, _, sockaddr in infos:
+        sock = socket.socket(family, type_, proto)
+        try:
+            if isinstance(timeout, (int, float)):
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as exc:
+            error = exc
+            sock.close()
+    raise error or OSError(f'{host} did not resolve')
+
+
+@lru_cache(maxsize=None)
+def _opener():
+    # urllib.request pulls in http.client and email, only needed on a miss
+    import http.client
+    import urllib.request
+
+    class PublicHTTPConnection(http.client.HTTPConnection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._create_connection = _public_connection
+
+    class PublicHTTPSConnection(http.client.HTTPSConnection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._create_connection = _public_connection
+
+    class PublicHTTPHandler(urllib.request.HTTPHandler):
+        def do_open(self, http_class, request, **kwargs):
+            return super().do_open(PublicHTTPConnection, request, **kwargs)
+
+    class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+        def do_open(self, http_class, request, **kwargs):
+            return super().do_open(PublicHTTPSConnection, request, **kwargs)
+
+    # only these handlers: no proxies from the environment, no file:// or
+    # ftp://; a redirect connects through the handlers above again
+    opener = urllib.request.OpenerDirector()
+    for handler in (PublicHTTPHandler(), PublicHTTPSHandler(), urllib.request.HTTPRedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()):
+        opener.add_handler(handler)
+    return opener
+
+
+def fetch_image(url, timeout=10, max_bytes=20 * 1024 * 1024):
+    '''
+    the bytes at the http(s) `url`, at most `max_bytes` of them; ValueError
+    if it, or a link it redirects to, isn't on a public address
+    '''
+    import urllib.parse
+    import urllib.request
+    if urllib.parse.urlsplit(url).scheme not in ('http', 'https'):
+        raise ValueError(f'not an http(s) link: {url}')
+    with _opener().open(urllib.request.Request(url, headers={'User-Agent': 'fyyur'}),
+                        timeout=timeout) as response:
+        body = response.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        raise ValueError(f'larger than {max_bytes} bytes: {url}')
+    return body
+
+
+@lru_cache(maxsize=None)
+def _pillow():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def make_thumbnails(data, widths, quality=82):
+    '''
+    {width: encoded thumbnail} of the image `data`, JPEG or, for images with
+    transparency, PNG; an animation gives its first frame
+    '''
+    Image, ImageOps = _pillow()
+    with Image.open(io.BytesIO(data)) as image:
+        # a JPEG decodes straight to a smaller scale when that is enough
+        image.draft('RGB', (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(image)
+        transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+
+    thumbnails = {}
+    for width in widths:
+        thumbnail = image if image.width <= width else \
+            image.resize((width, max(1, round(image.height * width / image.width))),
+                         Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        if transparent:
+            thumbnail.save(output, 'PNG', optimize=True)
+        else:
+            thumbnail.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+        thumbnails[width] = output.getvalue()
+    return thumbnails
+
+
+class DiskCache:
+    '''files under `directory`, the least recently used removed past `max_bytes`'''
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None  # bytes stored, as far as this process knows
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def get(self, name):
+        '''the path of the file `name`, None if it isn't cached'''
+        path = self.path(name)
+        try:
+            used = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - used > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                return None
+        return path
+
+    def set(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside then renamed, readers never see half a file
+        partial_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(partial_path, 'wb') as file:
+            file.write(data)
+        os.replace(partial_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                for file in os.scandir(entry.path):
+                    if not file.name.endswith('.tmp'):
+                        stat = file.stat()
+                        yield file.path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        # from what is on disk, other workers write here too; down to 90%
+        # so that the next few writes don't scan again
+        files = sorted(self._files(), key=lambda file: file[2])
+        size = sum(file[1] for file in files)
+        for path, file_size, _ in files:
+            if size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        self._size = size
+
+
+class ImageProxy:
+    '''thumbnails at `widths` of the images `fetch(url)` returns, kept in `cache`'''
+
+    def __init__(self, cache, widths, fetch, secret_key, retry_after=300, quality=82):
+        self.cache = cache
+        self.widths = tuple(widths)
+        self.fetch = fetch
+        self.retry_after = retry_after
+        self.quality = quality
+        self._failed = {}  # key -> time to try again, oldest first
+        self._failed_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(32)]
+        self._signer = URLSafeSerializer(secret_key, salt='image-link')
+        # pages link the same images over and over, and signing and building
+        # a url cost more than the rest of a listing row
+        self.url = lru_cache(maxsize=8192)(self._url)
+
+    def _url(self, script_root, link, width):
+        # script_root, what url_for() depends on here, is part of the cache key
+        return url_for('image', width=width, token=self._signer.dumps(link))
+
+    def link(self, token):
+        '''the link `token` was made for, BadSignature if it wasn't made here'''
+        return self._signer.loads(token)
+
+    def _name(self, key, width):
+        # without Pillow there is one file per image, the original
+        return f'{key}-{width if _pillow() is not None else 0}'
+
+    def _fail(self, key):
+        now = time.monotonic()
+        with self._failed_lock:
+            self._failed.pop(key, None)
+            if len(self._failed) >= MAX_FAILED:
+                # the expired ones first, then the oldest
+                self._failed = {key: retry for key, retry in self._failed.items() if retry > now}
+                while len(self._failed) >= MAX_FAILED:
+                    self._failed.pop(next(iter(self._failed)))
+            self._failed[key] = now + self.retry_after
+
+    def thumbnail(self, url, width):
+        '''the cached file of `url` at `width`, None if it can't be had'''
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        path = self.cache.get(self._name(key, width))
+        if path is not None or self._failed.get(key, 0) > time.monotonic():
+            return path
+
+        # one fetch per image, however many of its thumbnails are asked for at once
+        with self._locks[int(key[:8], 16) % len(self._locks)]:
+            path = self.cache.get(self._name(key, width))
+            if path is not None:
+                return path
+            try:
+                data = self.fetch(url)
+                if sniff_mimetype(data[:16]) is None:
+                    raise ValueError('not an image')
+                if _pillow() is None:
+                    thumbnails = {0: data}
+                else:
+                    thumbnails = make_thumbnails(data, self.widths, self.quality)
+            except Exception as error:
+                log.warning('image %s: %s', url, error)
+                self._fail(key)
+                return None
+            for size, thumbnail in thumbnails.items():
+                self.cache.set(f'{key}-{size}', thumbnail)
+            with self._failed_lock:
+                self._failed.pop(key, None)
+            return self.cache.path(self._name(key, width))
+
+
+def thumbnail_url(link, width):
+    '''url of the thumbnail of the image at `link`, `width` one of IMAGE_WIDTHS'''
+    if not link:
+        return link
+    return current_app.extensions['image_proxy'].url(request.script_root, link, width)
+
+
+def send_image(width, token):
+    proxy = current_app.extensions['image_proxy']
+    try:
+        url = proxy.link(token)
+    except BadSignature:
+        abort(404)
+    if width not in proxy.widths:
+        abort(404)
+
+    path = proxy.thumbnail(url, width)
+    if path is None:
+        return redirect(url)
+    try:
+        with open(path, 'rb') as file:
+            mimetype = sniff_mimetype(file.read(16))
+    except FileNotFoundError:
+        # evicted by another worker just now
+        return redirect(url)
+    response = send_file(path, mimetype=mimetype, max_age=MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    # the name is a hash of the link
+    response.set_etag(os.path.basename(path))
+    return response.make_conditional(request)
+
+
+def init_app(app):
+    config = app.config
+    fetch = config['IMAGE_FETCHER'] or partial(
+        fetch_image, timeout=config['IMAGE_FETCH_TIMEOUT'], max_bytes=config['IMAGE_MAX_SOURCE_BYTES'])
+    app.extensions['image_proxy'] = ImageProxy(
+        DiskCache(config['IMAGE_CACHE_DIR'], config['IMAGE_CACHE_MAX_BYTES']),
+        config['IMAGE_WIDTHS'], fetch, app.secret_key,
+        retry_after=config['IMAGE_RETRY_AFTER'], quality=config['IMAGE_QUALITY'])
+    app.add_url_rule('/images/<int:width>/<token>', 'image', send_image)
+    app.jinja_env.globals['thumbnail_url'] = thumbnail_url
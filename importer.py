@@ -0,0 +1,221 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+import dateutil.parser
+from sqlalchemy import Boolean, DateTime, Integer, select
+
+
+# Bulk loading of CSV / JSON Lines files.
+# Records are streamed in chunks. Each chunk is validated, then written with
+# one COPY on Postgres or one executemany INSERT elsewhere, then committed.
+
+
+class ImportDataError(Exception):
+    pass
+
+
+class ImportStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.imported = 0
+        self.rejected = 0
+        self.rejections = []  # (record number, reason), first few only
+
+    def reject(self, number, reason):
+        self.rejected += 1
+        if len(self.rejections) < 20:
+            self.rejections.append((number, reason))
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.imported / elapsed if elapsed else 0.0
+
+
+def detect_format(filename):
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise ImportDataError(f'cannot tell the format of {filename!r}, pass --format')
+
+
+def read_records(stream, fmt):
+    '''yields the records of a text stream as dicts, without reading it whole'''
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ImportDataError(f'unknown format {fmt!r}')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _coerce(column, value):
+    if value is None or value == '':
+        return None
+    if isinstance(column.type, Integer):
+        return int(value)
+    if isinstance(column.type, Boolean):
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+        return bool(value)
+    if isinstance(column.type, DateTime) and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return dateutil.parser.parse(value)
+    if isinstance(value, list):  # genres given as a JSON list
+        return ', '.join(value)
+    return value
+
+
+def coerce_record(table, record, aliases=None):
+    '''maps a raw record onto `table`'s columns, converting the values'''
+    row = {}
+    for key, value in record.items():
+        key = (aliases or {}).get(key, key)
+        if key not in table.c:
+            raise ImportDataError(f'unknown column {key!r} for {table.name}')
+        row[key] = _coerce(table.c[key], value)
+    return row
+
+
+def existing_ids(session, table, ids):
+    found = set()
+    ids = list(ids)
+    # keep the IN lists a reasonable size
+    for start in range(0, len(ids), 10000):
+        found.update(session.execute(
+            select(table.c.id).where(table.c.id.in_(ids[start:start + 10000]))).scalars())
+    return found
+
+
+def validate_references(session, table, rows, numbers, stats, known):
+    '''
+    drops rows whose foreign keys point at missing rows, checking each
+    referenced table once per chunk; `known` remembers ids already seen
+    '''
+    valid = [True] * len(rows)
+    for fk in table.foreign_keys:
+        column, target = fk.parent.name, fk.column.table
+        seen = known.setdefault(target.name, set())
+        wanted = {row.get(column) for row in rows} - seen - {None}
+        if wanted:
+            seen.update(existing_ids(session, target, wanted))
+        for i, row in enumerate(rows):
+            if valid[i] and row.get(column) not in seen:
+                valid[i] = False
+                stats.reject(numbers[i], f'{column} {row.get(column)} does not exist')
+    return [row for row, ok in zip(rows, valid) if ok]
+
+
+def _missing_value(column):
+    default = column.default
+    return default.arg if default is not None and default.is_scalar else None
+
+
+def uniform_rows(table, rows):
+    '''
+    gives every row the same keys, as executemany and COPY need, including
+    the columns with a Python-side default: COPY wouldn't apply it
+    '''
+    keys = sorted(set().union(*rows).union(
+        column.name for column in table.columns
+        if column.default is not None and column.default.is_scalar))
+    missing = {key: _missing_value(table.c[key]) for key in keys}
+    return keys, [{key: row[key] if row.get(key) is not None else missing[key]
+                   for key in keys} for row in rows]
+
+
+def insert_rows(session, table, rows):
+    if not rows:
+        return
+    keys, rows = uniform_rows(table, rows)
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        copy_rows(connection, table, keys, rows)
+    else:
+        session.execute(table.insert(), rows)
+
+
+def copy_rows(connection, table, keys, rows):
+    '''writes `rows` with a single COPY ... FROM STDIN'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[key] is None else row[key] for key in keys])
+    buffer.seek(0)
+
+    columns = ', '.join(f'"{key}"' for key in keys)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY "{table.name}" ({columns}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')', buffer)
+    finally:
+        cursor.close()
+
+
+def reset_id_sequence(session, table):
+    if session.connection().dialect.name == 'postgresql':
+        session.execute(
+            f'SELECT setval(pg_get_serial_sequence(\'"{table.name}"\', \'id\'), '
+            f'coalesce(max(id), 1)) FROM "{table.name}"')
+
+
+def import_records(session, table, records, chunk_size, prepare=None, after_chunk=None,
+                   report=None, aliases=None):
+    '''
+    Loads `records` into `table` chunk by chunk and returns the ImportStats.
+
+    `prepare(row)` may adjust each row before it is written, `after_chunk(rows)`
+    runs in the chunk's transaction and `report(stats)` after each commit.
+    '''
+    stats = ImportStats()
+    known = {}
+    number = 0
+    has_ids = False
+
+    for chunk in chunked(records, chunk_size):
+        rows, numbers = [], []
+        for record in chunk:
+            number += 1
+            try:
+                row = coerce_record(table, record, aliases)
+            except (ValueError, TypeError, OverflowError) as error:
+                stats.reject(number, str(error))
+                continue
+            if prepare is not None:
+                prepare(row)
+            has_ids = has_ids or row.get('id') is not None
+            rows.append(row)
+            numbers.append(number)
+
+        rows = validate_references(session, table, rows, numbers, stats, known)
+        insert_rows(session, table, rows)
+        if after_chunk is not None:
+            after_chunk(rows)
+        session.commit()
+
+        stats.imported += len(rows)
+        if report is not None:
+            report(stats)
+
+    if has_ids:
+        reset_id_sequence(session, table)
+        session.commit()
+    return stats
@@ -0,0 +1,174 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Per endpoint request metrics: latency, SQL statement count, time spent in
+# the database and time spent rendering templates, kept as histograms and
+# rendered in the Prometheus text format. Each worker process keeps its own;
+# Prometheus sums them over the scraped instances.
+#
+# The bookkeeping per request is a few counters on `g`, and per observation
+# a bisect and a short lock, so it can stay on in production.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}  # endpoint -> [count per bucket..., count above, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(endpoint)
+            if series is None:
+                series = self._series[endpoint] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = sorted((endpoint, list(series)) for endpoint, series in self._series.items())
+        for endpoint, series in snapshot:
+            label = 'endpoint="{}"'.format(
+                endpoint.replace('\\', '\\\\').replace('"', '\\"'))
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                total += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {total}')
+            lines.append(f'{self.name}_sum{{{label}}} {series[-1]}')
+            lines.append(f'{self.name}_count{{{label}}} {total}')
+        return lines
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.query_started = None
+
+
+def current_timings():
+    if has_request_context():
+        return g.get('request_timings')
+    return None
+
+
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            timings = current_timings()
+            if timings is not None:
+                timings.template += time.perf_counter() - started
+
+    def generate(self, *args, **kwargs):
+        # streamed templates: the time spent producing the pieces; queries
+        # run by the template's generators count as template time here too
+        pieces = super().generate(*args, **kwargs)
+        timings = current_timings()
+        if timings is None:
+            yield from pieces
+            return
+        clock = time.perf_counter
+        while True:
+            started = clock()
+            try:
+                piece = next(pieces)
+            except StopIteration:
+                return
+            finally:
+                timings.template += clock() - started
+            yield piece
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    if timings is not None:
+        timings.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    if timings is not None and timings.query_started is not None:
+        timings.queries += 1
+        timings.db += time.perf_counter() - timings.query_started
+        timings.query_started = None
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.latency = Histogram('fyyur_request_duration_seconds',
+                                 'Time to build the response.', LATENCY_BUCKETS)
+        self.queries = Histogram('fyyur_request_db_queries',
+                                 'SQL statements issued per request.', QUERY_BUCKETS)
+        self.db_time = Histogram('fyyur_request_db_seconds',
+                                 'Time spent executing SQL per request.', LATENCY_BUCKETS)
+        self.template_time = Histogram('fyyur_request_template_seconds',
+                                       'Time spent rendering templates per request.',
+                                       LATENCY_BUCKETS)
+        self.server_timing = False
+
+    def init_app(self, app):
+        '''instruments `app` and every engine, as the METRICS_* settings say'''
+        if not app.config['METRICS_ENABLED']:
+            return
+        self.server_timing = app.config['METRICS_SERVER_TIMING']
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        # the listeners are global, installed once for however many apps
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _start(self):
+        g.request_timings = RequestTimings()
+
+    def _finish(self, response):
+        timings = g.get('request_timings')
+        if timings is None:
+            return response
+        if response.is_streamed:
+            # the body is still to be built, observed once it has been sent;
+            # too late for a Server-Timing header
+            endpoint = request.endpoint or 'unmatched'
+            response.call_on_close(lambda: self._observe(endpoint, timings))
+            return response
+
+        elapsed = self._observe(request.endpoint or 'unmatched', timings)
+        if self.server_timing:
+            response.headers['Server-Timing'] = ', '.join((
+                f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"',
+                f'tpl;dur={timings.template * 1000:.1f}',
+                f'app;dur={elapsed * 1000:.1f}',
+            ))
+        return response
+
+    def _observe(self, endpoint, timings):
+        elapsed = time.perf_counter() - timings.started
+        self.latency.observe(endpoint, elapsed)
+        self.queries.observe(endpoint, timings.queries)
+        self.db_time.observe(endpoint, timings.db)
+        self.template_time.observe(endpoint, timings.template)
+        return elapsed
+
+    def render(self):
+        histograms = (self.latency, self.queries, self.db_time, self.template_time)
+        return '\n'.join(line for histogram in histograms for line in histogram.render()) + '\n'
@@ -0,0 +1,36 @@
+"""add trigram search indexes on Venue and Artist
+
+Revision ID: 5e1f7a2c9b3d
+Revises: 94c710251dc4
+Create Date: 2026-10-18 09:12:41.503218
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1f7a2c9b3d'
+down_revision = '94c710251dc4'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_COLUMNS = ('name', 'city', 'genres')
+
+
+def upgrade():
+    # pg_trgm GIN indexes serve the ILIKE '%term%' and similarity() ranking of search
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        for column in SEARCH_COLUMNS:
+            op.create_index(
+                f'ix_{table}_{column}_trgm', table, [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+            )
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        for column in SEARCH_COLUMNS:
+            op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
@@ -0,0 +1,45 @@
+"""add stored show counters on Venue and Artist
+
+Revision ID: b7d3e9a41f62
+Revises: 5e1f7a2c9b3d
+Create Date: 2026-10-18 10:02:17.114820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e9a41f62'
+down_revision = '5e1f7a2c9b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Shows', sa.Column('is_upcoming', sa.Boolean(), server_default=sa.false(), nullable=False))
+    # rollover reads only the shows still counted as upcoming
+    op.create_index('ix_Shows_event_date_upcoming', 'Shows', ['event_date'],
+                    postgresql_where=sa.text('is_upcoming'))
+
+    # backfill from the existing shows
+    op.execute('UPDATE "Shows" SET is_upcoming = coalesce(event_date > now(), false)')
+    for table, owner in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+            UPDATE "{table}" SET
+                upcoming_shows_count = (SELECT count(*) FROM "Shows"
+                    WHERE "Shows".{owner} = "{table}".id AND "Shows".is_upcoming),
+                past_shows_count = (SELECT count(*) FROM "Shows"
+                    WHERE "Shows".{owner} = "{table}".id AND NOT "Shows".is_upcoming)
+        ''')
+
+
+def downgrade():
+    op.drop_index('ix_Shows_event_date_upcoming', table_name='Shows')
+    op.drop_column('Shows', 'is_upcoming')
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
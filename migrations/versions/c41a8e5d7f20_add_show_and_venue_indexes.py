@@ -0,0 +1,38 @@
+"""add composite Shows indexes, Venue area index and lower(name) indexes
+
+Revision ID: c41a8e5d7f20
+Revises: b7d3e9a41f62
+Create Date: 2026-10-18 11:20:53.871442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a8e5d7f20'
+down_revision = 'b7d3e9a41f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # detail pages: shows of one venue/artist split on event_date
+    op.create_index('ix_Shows_venue_id_event_date', 'Shows', ['venue_id', 'event_date'])
+    op.create_index('ix_Shows_artist_id_event_date', 'Shows', ['artist_id', 'event_date'])
+    # /shows keyset pagination on (event_date, id)
+    op.create_index('ix_Shows_event_date_id', 'Shows', ['event_date', 'id'])
+    # venues by area
+    op.create_index('ix_Venue_city_state', 'Venue', ['city', 'state'])
+    # case-insensitive name lookups
+    op.create_index('ix_Venue_lower_name', 'Venue', [sa.text('lower(name)')])
+    op.create_index('ix_Artist_lower_name', 'Artist', [sa.text('lower(name)')])
+
+
+def downgrade():
+    op.drop_index('ix_Artist_lower_name', table_name='Artist')
+    op.drop_index('ix_Venue_lower_name', table_name='Venue')
+    op.drop_index('ix_Venue_city_state', table_name='Venue')
+    op.drop_index('ix_Shows_event_date_id', table_name='Shows')
+    op.drop_index('ix_Shows_artist_id_event_date', table_name='Shows')
+    op.drop_index('ix_Shows_venue_id_event_date', table_name='Shows')
@@ -0,0 +1,61 @@
+"""add Genre table with Venue and Artist genre links
+
+Revision ID: e8a2f4c61b07
+Revises: c41a8e5d7f20
+Create Date: 2026-10-18 13:05:41.302157
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a2f4c61b07'
+down_revision = 'c41a8e5d7f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table, owner in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.create_table(f'{table}_Genre',
+        sa.Column(owner, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([owner], [f'{table}.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(owner, 'genre_id')
+        )
+        # genre filters: owners of one genre, read from the index alone
+        op.create_index(f'ix_{table}_Genre_genre_id_{owner}', f'{table}_Genre', ['genre_id', owner])
+    op.create_index('ix_Artist_city_state', 'Artist', ['city', 'state'])
+
+    # backfill from the comma-joined genres columns; the unnested values get
+    # their own alias, a bare `name` would be ambiguous with the tables' own
+    for table, owner in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+            INSERT INTO "Genre" (name)
+            SELECT DISTINCT trim(g.genre_name)
+            FROM "{table}", unnest(string_to_array("{table}".genres, ',')) AS g(genre_name)
+            WHERE trim(g.genre_name) <> ''
+            ON CONFLICT (name) DO NOTHING
+        ''')
+        op.execute(f'''
+            INSERT INTO "{table}_Genre" ({owner}, genre_id)
+            SELECT DISTINCT "{table}".id, "Genre".id
+            FROM "{table}", unnest(string_to_array("{table}".genres, ',')) AS g(genre_name)
+            JOIN "Genre" ON "Genre".name = trim(g.genre_name)
+        ''')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_city_state', table_name='Artist')
+    for table, owner in (('Artist', 'artist_id'), ('Venue', 'venue_id')):
+        op.drop_index(f'ix_{table}_Genre_genre_id_{owner}', table_name=f'{table}_Genre')
+        op.drop_table(f'{table}_Genre')
+    op.drop_table('Genre')
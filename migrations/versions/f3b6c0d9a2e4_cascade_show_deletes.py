@@ -0,0 +1,33 @@
+"""delete shows with their venue or artist in the database
+
+Revision ID: f3b6c0d9a2e4
+Revises: e8a2f4c61b07
+Create Date: 2026-10-18 15:42:17.508311
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b6c0d9a2e4'
+down_revision = 'e8a2f4c61b07'
+branch_labels = None
+depends_on = None
+
+
+FOREIGN_KEYS = (('Shows_venue_id_fkey', 'Venue', 'venue_id'),
+                ('Shows_artist_id_fkey', 'Artist', 'artist_id'))
+
+
+def upgrade():
+    # deleting a venue or artist deletes its shows in the same statement,
+    # instead of the ORM loading and deleting them one by one
+    for name, table, column in FOREIGN_KEYS:
+        op.drop_constraint(name, 'Shows', type_='foreignkey')
+        op.create_foreign_key(name, 'Shows', table, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    for name, table, column in FOREIGN_KEYS:
+        op.drop_constraint(name, 'Shows', type_='foreignkey')
+        op.create_foreign_key(name, 'Shows', table, [column], ['id'])
@@ -0,0 +1,393 @@
+from datetime import datetime
+
+from sqlalchemy import and_, event, exists, false
+from sqlalchemy.sql import func  # to set default datetime later
+
+import search
+from database import RoutingSQLAlchemy
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+# bound to the app by create_app()
+db = RoutingSQLAlchemy()
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_city_state', 'city', 'state'),
+        db.Index('ix_Venue_lower_name', func.lower(db.column('name'))),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    name = db.Column(db.String, nullable=True)
+    city = db.Column(db.String(120), nullable=True)
+    state = db.Column(db.String(120), nullable=True)
+    address = db.Column(db.String(120), nullable=True)
+    phone = db.Column(db.String(120), nullable=True)
+    image_link = db.Column(db.String(500), nullable=True)
+    facebook_link = db.Column(db.String(120), nullable=True)
+
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+    genres = db.Column(db.String(500), nullable=True)
+    website_link = db.Column(db.String(120), nullable=True)
+    talent_search = db.Column(db.Boolean, default=False, nullable=False)
+    seeking_description = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True),
+                           server_default=func.now(), nullable=False)
+
+    # show counters, kept up to date by the Show events and roll_over_shows()
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    # Shows relationship column
+    # shows and genre links are deleted by the database (ON DELETE CASCADE),
+    # the ORM doesn't load them to delete them one by one
+    show = db.relationship('Show', backref='show_venue',
+                           lazy=True, cascade='all, delete', passive_deletes=True)
+
+    # normalized copy of `genres`, kept in step by set_genres()
+    genre_list = db.relationship('Genre', secondary='Venue_Genre', lazy=True,
+                                 passive_deletes=True)
+
+    def __repr__(self) -> str:
+        return f'<Venue {self.id}, {self.name}>'
+
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_city_state', 'city', 'state'),
+        db.Index('ix_Artist_lower_name', func.lower(db.column('name'))),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    name = db.Column(db.String, nullable=True)
+    city = db.Column(db.String(120), nullable=True)
+    state = db.Column(db.String(120), nullable=True)
+    phone = db.Column(db.String(120), nullable=True)
+    genres = db.Column(db.String(120), nullable=True)
+    image_link = db.Column(db.String(500), nullable=True)
+    facebook_link = db.Column(db.String(120), nullable=True)
+
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+    website_link = db.Column(db.String(120), nullable=True)
+    venue_search = db.Column(db.Boolean, default=False, nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True),
+                           server_default=func.now(), nullable=True)
+
+    # show counters, kept up to date by the Show events and roll_over_shows()
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    # Shows relationship Column
+    # shows and genre links are deleted by the database (ON DELETE CASCADE),
+    # the ORM doesn't load them to delete them one by one
+    show = db.relationship('Show', backref='show_artist',
+                           lazy=True, cascade='all, delete', passive_deletes=True)
+
+    # normalized copy of `genres`, kept in step by set_genres()
+    genre_list = db.relationship('Genre', secondary='Artist_Genre', lazy=True,
+                                 passive_deletes=True)
+
+    def __repr__(self) -> str:
+        return f'<Artist {self.id}, {self.name}>'
+
+
+# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+class Show(db.Model):
+    __tablename__ = 'Shows'
+    __table_args__ = (
+        db.Index('ix_Shows_venue_id_event_date', 'venue_id', 'event_date'),
+        db.Index('ix_Shows_artist_id_event_date', 'artist_id', 'event_date'),
+        db.Index('ix_Shows_event_date_id', 'event_date', 'id'),
+        # rollover reads only the shows still counted as upcoming; SQLite
+        # matches the predicate as written, and writes booleans as `= 1`
+        db.Index('ix_Shows_event_date_upcoming', 'event_date',
+                 postgresql_where=db.text('is_upcoming'), sqlite_where=db.text('is_upcoming = 1')),
+    )
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    event_date = db.Column(db.DateTime)
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True),
+                           server_default=func.now())
+
+    # which venue/artist counter the show is counted in; flipped by roll_over_shows()
+    is_upcoming = db.Column(db.Boolean, default=False, server_default=false(), nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<Show {self.id}, artist: {self.venue_id}, location: {self.venue_id}>'
+
+
+# Genres, one row per name, linked to venues and artists. The comma-joined
+# `genres` columns remain for display and text search; the genre filters
+# query these links through their (genre_id, owner id) indexes.
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __repr__(self) -> str:
+        return f'<Genre {self.id}, {self.name}>'
+
+
+venue_genres = db.Table(
+    'Venue_Genre',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Index('ix_Venue_Genre_genre_id_venue_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table(
+    'Artist_Genre',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Index('ix_Artist_Genre_genre_id_artist_id', 'genre_id', 'artist_id'),
+)
+
+# owner id column of each model's genre links
+GENRE_LINKS = {Venue: venue_genres.c.venue_id, Artist: artist_genres.c.artist_id}
+
+
+def split_genres(genres):
+    return [name.strip() for name in (genres or '').split(',') if name.strip()]
+
+
+def genres_named(names):
+    # Genre rows for `names`, in order, adding the ones not seen before with
+    # one INSERT, so it's at most three statements however many are new
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+    found = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(names))}
+    missing = [name for name in names if name not in found]
+    if missing:
+        db.session.execute(Genre.__table__.insert(), [{'name': name} for name in missing])
+        found.update((genre.name, genre) for genre in Genre.query.filter(Genre.name.in_(missing)))
+    return [found[name] for name in names]
+
+
+def set_genres(entity, names):
+    # sets a venue's or artist's genres, both the display string and the links
+    entity.genres = ', '.join(names)
+    entity.genre_list = genres_named(names)
+
+
+def link_genres(model, chunk_size=1000):
+    '''
+    Links the venues or artists written without the ORM, e.g. by the bulk
+    import, to the genres named in their `genres` column.
+    '''
+    owner = GENRE_LINKS[model]
+    last_id = 0
+    while True:
+        rows = db.session.query(model.id, model.genres).\
+            filter(model.id > last_id, model.genres.isnot(None),
+                   ~exists().where(owner == model.id)).\
+            order_by(model.id).limit(chunk_size).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        names = {row.id: list(dict.fromkeys(split_genres(row.genres))) for row in rows}
+        genres = genres_named(name for row_names in names.values() for name in row_names)
+        ids = {genre.name: genre.id for genre in genres}
+        links = [{owner.name: owner_id, 'genre_id': ids[name]}
+                 for owner_id, row_names in names.items() for name in row_names]
+        if links:
+            db.session.execute(owner.table.insert(), links)
+        db.session.commit()
+
+
+def adjust_show_counts(connection, show, delta):
+    # moves the show's venue and artist counters by `delta`
+    counter = 'upcoming_shows_count' if show.is_upcoming else 'past_shows_count'
+    for model, owner_id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+        column = model.__table__.c[counter]
+        connection.execute(model.__table__.update().
+                           where(model.__table__.c.id == owner_id).
+                           values({column: column + delta}))
+
+
+@event.listens_for(Show, 'before_insert')
+def classify_show(mapper, connection, show):
+    show.is_upcoming = show.event_date is not None and show.event_date > datetime.now()
+
+
+@event.listens_for(Show, 'after_insert')
+def count_show(mapper, connection, show):
+    adjust_show_counts(connection, show, 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def uncount_show(mapper, connection, show):
+    adjust_show_counts(connection, show, -1)
+
+
+def past_due_shows(now):
+    # filter of the shows counted as upcoming that took place by `now`
+    return and_(Show.is_upcoming, Show.event_date <= now)
+
+
+def roll_over_shows(now=None):
+    '''
+    Moves shows whose event_date has passed from their venue's and artist's
+    upcoming count to their past count. Returns the number of shows moved.
+    '''
+    due = past_due_shows(now or datetime.now())
+
+    for model, owner in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        moved = db.session.query(func.count(Show.id)).\
+            filter(due, owner == model.id).scalar_subquery()
+        db.session.query(model).\
+            filter(model.id.in_(db.session.query(owner).filter(due))).\
+            update({
+                model.upcoming_shows_count: model.upcoming_shows_count - moved,
+                model.past_shows_count: model.past_shows_count + moved,
+            }, synchronize_session=False)
+
+    count = db.session.query(Show).filter(due).\
+        update({Show.is_upcoming: False}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def uncount_shows(shows, *models):
+    '''
+    Takes the shows matching the filter `shows` off the upcoming and past
+    counters of their `models` (Venue and/or Artist), one UPDATE each.
+    '''
+    for model in models:
+        owner = Show.venue_id if model is Venue else Show.artist_id
+        removed = {
+            upcoming: db.session.query(func.count(Show.id)).
+            filter(shows, owner == model.id, Show.is_upcoming if upcoming else ~Show.is_upcoming).
+            scalar_subquery()
+            for upcoming in (True, False)
+        }
+        db.session.query(model).\
+            filter(model.id.in_(db.session.query(owner).filter(shows))).\
+            update({
+                model.upcoming_shows_count: model.upcoming_shows_count - removed[True],
+                model.past_shows_count: model.past_shows_count - removed[False],
+            }, synchronize_session=False)
+
+
+def delete_rows(model, ids):
+    '''
+    Deletes the venues, artists or shows `ids` in a few statements, however
+    many shows they have: the counters of the venues and artists losing
+    shows are taken down set-based, then one DELETE removes the rows, the
+    database their shows and genre links (ON DELETE CASCADE). The Show
+    events don't run. Returns the number of rows deleted; doesn't commit.
+    '''
+    ids = list(ids)
+    if model is Show:
+        uncount_shows(Show.id.in_(ids), Venue, Artist)
+    elif model is Venue:
+        # the venues' own counters go with them
+        uncount_shows(Show.venue_id.in_(ids), Artist)
+    else:
+        uncount_shows(Show.artist_id.in_(ids), Venue)
+    return db.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+
+
+def hold_booking(venue_id, artist_id):
+    '''
+    Locks the venue's and the artist's rows until the transaction ends, so
+    bookings of either are checked and made one at a time. Returns their
+    (venue_name, artist_name), None if one of them doesn't exist.
+
+    SQLite has no row locks and ignores FOR UPDATE; there the transaction
+    takes the database's write lock up front (BEGIN IMMEDIATE) instead.
+    '''
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+    return db.session.query(Venue.name.label('venue_name'), Artist.name.label('artist_name')).\
+        join(Artist, Artist.id == artist_id).\
+        filter(Venue.id == venue_id).\
+        with_for_update().first()
+
+
+def booking_conflicts(venue_id, artist_id, start, length):
+    '''
+    Which of 'venue' and 'artist' already has a show starting less than
+    `length` (a timedelta) before or after `start`. One statement of two
+    EXISTS, each a range scan of the (venue_id or artist_id, event_date)
+    index, whatever the number of shows.
+    '''
+    window = (Show.event_date > start - length, Show.event_date < start + length)
+    busy = db.session.query(
+        exists().where(Show.venue_id == venue_id, *window),
+        exists().where(Show.artist_id == artist_id, *window)).one()
+    return [party for party, taken in zip(('venue', 'artist'), busy) if taken]
+
+
+# models by the entity names of the bulk import/export endpoints and commands
+ENTITY_MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+
+# columns derived from other rows, left out of exports
+DERIVED_COLUMNS = {'upcoming_shows_count', 'past_shows_count', 'is_upcoming'}
+
+
+def export_columns(model):
+    return [column.name for column in model.__table__.columns if column.name not in DERIVED_COLUMNS]
+
+
+# public field names of each entity, as the pages and the API show them
+VENUE_FIELDS = {
+    'id': Venue.id,
+    'name': Venue.name,
+    'genres': Venue.genres,
+    'address': Venue.address,
+    'city': Venue.city,
+    'state': Venue.state,
+    'phone': Venue.phone,
+    'website': Venue.website_link,
+    'facebook_link': Venue.facebook_link,
+    'image_link': Venue.image_link,
+    'seeking_talent': Venue.talent_search,
+    'seeking_description': Venue.seeking_description,
+    'upcoming_shows_count': Venue.upcoming_shows_count,
+    'past_shows_count': Venue.past_shows_count,
+}
+
+ARTIST_FIELDS = {
+    'id': Artist.id,
+    'name': Artist.name,
+    'genres': Artist.genres,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'website': Artist.website_link,
+    'facebook_link': Artist.facebook_link,
+    'image_link': Artist.image_link,
+    'seeking_venue': Artist.venue_search,
+    'seeking_description': Artist.description,
+    'upcoming_shows_count': Artist.upcoming_shows_count,
+    'past_shows_count': Artist.past_shows_count,
+}
+
+SHOW_FIELDS = {
+    'id': Show.id,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+    'start_time': Show.event_date,
+}
+
+
+# FTS5 search tables for the SQLite backend (Postgres uses the trigram indexes migration)
+search.install_fts(Venue)
+search.install_fts(Artist)
@@ -0,0 +1,146 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from functools import cached_property
+
+from sqlalchemy import tuple_
+
+
+# Keyset (cursor) pagination.
+# A page is fetched with `WHERE (keys) > (cursor) ORDER BY keys LIMIT n`, so any
+# page costs the same as the first one, unlike OFFSET which scans every
+# skipped row.
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+    '''returns the key values held by `cursor`, raises ValueError if it is not
+    a cursor for `keys`'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError(f'invalid cursor {cursor!r}')
+
+    if not isinstance(payload, list) or len(payload) != len(keys):
+        raise ValueError(f'invalid cursor {cursor!r}')
+
+    values = []
+    for key, value in zip(keys, payload):
+        if value is not None and key.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        values.append(value)
+    return values
+
+
+def clamp_page_size(per_page, default, maximum):
+    try:
+        per_page = int(per_page)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(per_page, maximum))
+
+
+def keyset_query(query, keys, per_page, after=None, before=None):
+    '''narrows `query`, a Query or select(), to the rows of one page plus one
+    telling whether there are more; raises ValueError on a bad cursor'''
+    key_tuple = tuple_(*keys)
+
+    if before is not None:
+        # walk backwards from the cursor, keyset_page() flips the rows back
+        return query.filter(key_tuple < tuple_(*decode_cursor(before, keys))).\
+            order_by(*[key.desc() for key in keys]).\
+            limit(per_page + 1)
+
+    if after is not None:
+        query = query.filter(key_tuple > tuple_(*decode_cursor(after, keys)))
+    return query.order_by(*keys).limit(per_page + 1)
+
+
+def keyset_page(items, key_of, per_page, after=None, before=None):
+    '''builds the page out of the rows fetched with keyset_query()'''
+    has_more = len(items) > per_page
+
+    if before is not None:
+        items = items[:per_page][::-1]
+        return KeysetPage(
+            items, per_page,
+            next_cursor=encode_cursor(key_of(items[-1])) if items else before,
+            prev_cursor=encode_cursor(key_of(items[0])) if has_more else None,
+        )
+
+    items = items[:per_page]
+    return KeysetPage(
+        items, per_page,
+        next_cursor=encode_cursor(key_of(items[-1])) if has_more else None,
+        prev_cursor=(encode_cursor(key_of(items[0])) if items else after)
+        if after is not None else None,
+    )
+
+
+class DeferredKeysetPage:
+    '''
+    The page of a query narrowed by keyset_query(), fetched on first use: a
+    streamed template can send what comes before the listing while the rows
+    are still being fetched.
+    '''
+
+    def __init__(self, query, key_of, per_page, after=None, before=None):
+        self.query = query
+        self.key_of = key_of
+        self.per_page = per_page
+        self.after = after
+        self.before = before
+
+    @cached_property
+    def page(self):
+        return keyset_page(self.query.all(), self.key_of, self.per_page,
+                           after=self.after, before=self.before)
+
+    def __getattr__(self, name):
+        # items, the cursors and has_next/has_prev, from the fetched page
+        return getattr(self.page, name)
+
+    def __iter__(self):
+        return iter(self.page)
+
+    def __len__(self):
+        return len(self.page)
+
+
+def keyset_paginate(query, keys, key_of, per_page, after=None, before=None):
+    '''
+    Paginates `query` on the unique, ascending column tuple `keys`.
+
+    `key_of(item)` returns the key values of a result item, in `keys` order.
+    Pass the `next_cursor` of a page as `after` to get the following page, or
+    its `prev_cursor` as `before` to get the previous one.
+    '''
+    items = keyset_query(query, keys, per_page, after, before).all()
+    return keyset_page(items, key_of, per_page, after, before)
@@ -0,0 +1,136 @@
+import logging
+import threading
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import Response, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Query budgets: a route, or any block of code, may issue at most N SQL
+# statements. The budget doesn't depend on the data, so a loop that queries
+# per row (N+1) breaks it as soon as there is more than a row or two.
+#
+#     @app.route('/venues')
+#     @query_budget(1)
+#     def venues(): ...
+#
+#     with query_budget(2, 'venue page'):
+#         ...
+#
+# A decorated view returning a streamed response is held to its budget until
+# the last chunk is sent, the queries its template runs included.
+#
+# What an overrun does depends on the QUERY_BUDGET setting: 'raise' raises
+# QueryBudgetExceeded, 'warn' logs the offending statements, 'off' doesn't
+# count at all. Left unset it raises under TESTING, warns under DEBUG and is
+# off otherwise.
+
+log = logging.getLogger(__name__)
+
+_active = ContextVar('query_budgets', default=())
+_installed = False
+_install_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for budget in _active.get():
+        budget.statements.append(statement)
+
+
+def _install():
+    global _installed
+    with _install_lock:
+        if not _installed:
+            event.listen(Engine, 'after_cursor_execute', _count_statement)
+            _installed = True
+
+
+def budget_mode():
+    if not has_app_context():
+        return 'raise'
+    mode = current_app.config.get('QUERY_BUDGET')
+    if mode:
+        return mode
+    if current_app.testing:
+        return 'raise'
+    return 'warn' if current_app.debug else 'off'
+
+
+class query_budget:
+    '''allows at most `limit` SQL statements, as a context manager or decorator'''
+
+    def __init__(self, limit, label=None):
+        self.limit = limit
+        self.label = label
+        self.statements = []
+        self._token = None
+
+    def __call__(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # a fresh budget per call, decorated views run in many threads
+            budget = query_budget(self.limit, self.label or view.__name__)
+            with budget:
+                response = view(*args, **kwargs)
+            if isinstance(response, Response) and response.is_streamed:
+                # a streamed response queries as it is sent, on the same budget
+                response.response = budget._streamed(response.response)
+            return response
+        return wrapper
+
+    def _streamed(self, chunks):
+        iterator = iter(chunks)
+        try:
+            while True:
+                self._enter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    self._leave()
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        if len(self.statements) > self.limit:
+            self.overrun()
+
+    def __enter__(self):
+        self.mode = budget_mode()
+        if self.mode != 'off':
+            _install()
+        self._enter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.mode == 'off':
+            return False
+        self._leave()
+        if exc_type is None and len(self.statements) > self.limit:
+            self.overrun()
+        return False
+
+    def _enter(self):
+        if self.mode != 'off':
+            self._token = _active.set(_active.get() + (self,))
+
+    def _leave(self):
+        if self._token is not None:
+            _active.reset(self._token)
+            self._token = None
+
+    def overrun(self):
+        message = '{}: {} SQL statements, budget {}\n{}'.format(
+            self.label or 'query budget', len(self.statements), self.limit,
+            '\n'.join(f'  {number}. {" ".join(statement.split())}'
+                      for number, statement in enumerate(self.statements, 1)))
+        if self.mode == 'raise':
+            raise QueryBudgetExceeded(message)
+        (current_app.logger if has_app_context() else log).warning(message)
@@ -0,0 +1,87 @@
+from sqlalchemy import DDL, column, event, func, literal_column, or_, select, table
+
+
+# Indexed, ranked search over venues and artists.
+# Postgres matches through pg_trgm GIN indexes on name, city and genres (see the
+# search indexes migration); SQLite, used for local testing, keeps an FTS5
+# trigram table per model in sync with triggers. Both backends rank the
+# matches, limit them and count the total with a window function, so a search
+# is a single round trip.
+
+SEARCH_COLUMNS = ('name', 'city', 'genres')
+
+# trigram indexes can't serve terms shorter than this
+MIN_INDEXED_TERM = 3
+
+
+def fts_table(model):
+    return f'{model.__tablename__}_fts'
+
+
+def install_fts(model):
+    '''creates the FTS5 table and its sync triggers along with `model`'s table
+    on SQLite'''
+    table, fts = model.__tablename__, fts_table(model)
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+
+    statements = [
+        f'''CREATE VIRTUAL TABLE "{fts}" USING fts5({columns},
+            content='{table}', content_rowid='id', tokenize='trigram')''',
+        f'''CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN
+            INSERT INTO "{fts}"(rowid, {columns}) VALUES (new.id, {new_values});
+        END''',
+        f'''CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN
+            INSERT INTO "{fts}"("{fts}", rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END''',
+        f'''CREATE TRIGGER "{fts}_au" AFTER UPDATE ON "{table}" BEGIN
+            INSERT INTO "{fts}"("{fts}", rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO "{fts}"(rowid, {columns}) VALUES (new.id, {new_values});
+        END''',
+    ]
+    for statement in statements:
+        event.listen(model.__table__, 'after_create',
+                     DDL(statement).execute_if(dialect='sqlite'))
+
+
+def _contains(column, term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.ilike(f'%{escaped}%', escape='\\')
+
+
+def search(session, model, term, limit, *columns, filters=()):
+    '''
+    Returns `(total, rows)` for the best `limit` matches of `term` in `model`'s
+    name, city or genres that also pass `filters`, best first. Each row holds
+    the model's id and name followed by `columns`.
+    '''
+    term = (term or '').strip()
+    total = func.count().over().label('total')
+    qs = session.query(model.id, model.name, *columns, total).filter(*filters)
+    dialect = session.bind.dialect.name
+
+    if dialect == 'sqlite' and len(term) >= MIN_INDEXED_TERM:
+        fts = table(fts_table(model), column('rowid'))
+        fts_ref = literal_column(f'"{fts.name}"')
+        # the term as a single FTS5 phrase; trigram tokens make it a substring match
+        phrase = '"' + term.replace('"', '""') + '"'
+        # ranked apart from the outer query: FTS5 won't rank next to a window
+        # function. bm25 weights make a name match outrank a city or genre match
+        matches = select(
+            fts.c.rowid,
+            func.bm25(fts_ref, literal_column('10.0'), literal_column('1.0'),
+                      literal_column('1.0')).label('rank'),
+        ).where(fts_ref.match(phrase)).subquery()
+        qs = qs.join(matches, matches.c.rowid == model.id).\
+            order_by(matches.c.rank, model.id)
+    else:
+        qs = qs.filter(or_(*[_contains(getattr(model, column), term)
+                             for column in SEARCH_COLUMNS]))
+        if dialect == 'postgresql' and term:
+            qs = qs.order_by(func.similarity(model.name, term).desc(), model.id)
+        else:
+            qs = qs.order_by(model.name, model.id)
+
+    rows = qs.limit(limit).all()
+    return (rows[0].total if rows else 0), rows
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from flask import Blueprint, abort, current_app, flash, render_template, request
+
+from database import replica_reads
+from helpers import cache_tags, cached_page, page_cache, paginate, show_filters, show_listing_query, \
+    stream_page
+from models import db, Show, SHOW_FIELDS, booking_conflicts, hold_booking
+from query_budget import query_budget
+
+bp = Blueprint('shows', __name__)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@bp.route('/shows')
+@query_budget(1)
+@cached_page
+@replica_reads
+def shows():
+    # displays list of shows at /shows
+    # TODO: replace with real venues data.
+
+    # one joined query selecting only what a show tile renders, optionally
+    # within ?from= and ?to=, of ?venue_id= or ?artist_id=; shows without a
+    # date are left out, as on the detail pages, the (event_date, id) cursor
+    # can't page past a NULL
+    upcoming_only = request.args.get('upcoming', type=int) == 1
+    try:
+        show_qs = show_listing_query(SHOW_FIELDS, upcoming_only).\
+            filter(Show.event_date.isnot(None), *show_filters())
+    except ValueError:
+        abort(400)
+
+    shows = paginate(show_qs, [Show.event_date, Show.id],
+                     lambda show: (show.start_time, show.id))
+
+    def listing():
+        # run by the template as it streams, the query with it
+        cache_tags('shows')
+        for show in shows:
+            cache_tags(f'venue:{show.venue_id}', f'artist:{show.artist_id}')
+            yield show._asdict()
+
+    return stream_page('pages/shows.html', shows=listing(), page=shows, upcoming_only=upcoming_only)
+
+
+@bp.route('/shows/create')
+@query_budget(0)
+def create_shows():
+    # renders form. do not touch.
+    from forms import ShowForm
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/shows/create', methods=['POST'])
+@query_budget(7)
+def create_show_submission():
+
+    # called to create new shows in the db, upon submitting new show listing form
+    # TODO: insert form data as a new Show record in the db, instead
+    from forms import ShowForm
+    form = ShowForm(request.form)
+
+    try:
+        data = Show(
+            artist_id=form.artist_id.data,
+            venue_id=form.venue_id.data,
+            event_date=form.start_time.data
+        )
+        # no double bookings: the venue and the artist are locked, then
+        # checked for a show within a booking slot of this one
+        booking = hold_booking(data.venue_id, data.artist_id)
+        if booking is None:
+            raise LookupError('no such venue or artist')
+        hours = current_app.config['BOOKING_SLOT_HOURS']
+        booked = booking_conflicts(data.venue_id, data.artist_id, data.event_date,
+                                   timedelta(hours=hours))
+        if booked:
+            db.session.rollback()
+            flash(f'Show could not be listed, the {" and the ".join(booked)} '
+                  f'{"are" if len(booked) > 1 else "is"} already booked within {hours} hours of it.')
+            # the picked names again, the hidden ids are kept by the form
+            return render_template('forms/new_show.html', form=form,
+                                   venue_name=booking.venue_name, artist_name=booking.artist_name)
+        db.session.add(data)
+        db.session.commit()
+        page_cache.invalidate('shows', 'venues', 'artists',
+                              f'venue:{data.venue_id}', f'artist:{data.artist_id}')
+
+        # on successful db insert, flash success
+        flash('Show was successfully listed!')
+    except:
+        db.session.rollback()
+
+        # TODO: on unsuccessful db insert, flash an error instead.
+        flash('An error occurred. Show could not be listed.')
+        # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
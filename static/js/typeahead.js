@@ -0,0 +1,88 @@
+/**
+ * @file
+ * Name typeahead: an input with data-typeahead="<url>" lists the names
+ * matching what is typed, fetched from <url>?q=, and picking one stores its
+ * id in the input whose id is given by data-target.
+ */
+(function () {
+  'use strict';
+
+  function typeahead(input) {
+    var group = input.parentNode;
+    var menu = group.querySelector('.typeahead-menu');
+    var target = document.getElementById(input.dataset.target);
+    var timer = null, request = null, matches = [], active = -1;
+
+    function close() {
+      group.classList.remove('open');
+      active = -1;
+    }
+
+    function choose(match) {
+      input.value = match.name;
+      target.value = match.id;
+      close();
+    }
+
+    function highlight(index) {
+      var links = menu.querySelectorAll('li');
+      if (!links.length) { return; }
+      active = (index + links.length) % links.length;
+      for (var i = 0; i < links.length; i++) {
+        links[i].classList.toggle('active', i === active);
+      }
+    }
+
+    function render(found) {
+      matches = found;
+      active = -1;
+      menu.innerHTML = '';
+      found.forEach(function (match) {
+        var item = document.createElement('li');
+        var link = document.createElement('a');
+        link.href = '#';
+        link.textContent = match.name + (match.city ? ' (' + match.city + ', ' + match.state + ')' : '');
+        // before the input's blur closes the menu
+        link.addEventListener('mousedown', function (event) {
+          event.preventDefault();
+          choose(match);
+        });
+        item.appendChild(link);
+        menu.appendChild(item);
+      });
+      group.classList.toggle('open', found.length > 0);
+    }
+
+    function search() {
+      var q = input.value.trim();
+      if (request) { request.abort(); }
+      if (!q) { render([]); return; }
+      request = new AbortController();
+      fetch(input.dataset.typeahead + '?q=' + encodeURIComponent(q), {signal: request.signal})
+        .then(function (response) { return response.json(); })
+        .then(function (json) { render(json.data || []); })
+        .catch(function () {});
+    }
+
+    input.addEventListener('input', function () {
+      target.value = '';
+      clearTimeout(timer);
+      timer = setTimeout(search, 100);
+    });
+    input.addEventListener('keydown', function (event) {
+      if (!group.classList.contains('open')) { return; }
+      if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+        event.preventDefault();
+        highlight(active + (event.key === 'ArrowDown' ? 1 : -1));
+      } else if (event.key === 'Enter') {
+        event.preventDefault();
+        choose(matches[Math.max(active, 0)]);
+      } else if (event.key === 'Escape') {
+        close();
+      }
+    });
+    input.addEventListener('blur', close);
+  }
+
+  Array.prototype.forEach.call(document.querySelectorAll('[data-typeahead]'), typeahead);
+})();
@@ -0,0 +1,79 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# the app is a set of top-level modules, importable from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, Venue, Artist, Show, set_genres  # noqa: E402
+
+GENRES = ['Jazz', 'Blues', 'Folk', 'Rock n Roll', 'Classical']
+
+
+def make_app(tmp_path, **config):
+    return create_app({
+        'TESTING': True,
+        'QUERY_BUDGET': 'raise',
+        'SECRET_KEY': 'test',
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'SQLALCHEMY_BINDS': {},
+        'WTF_CSRF_ENABLED': False,
+        # a cache hit would run no query at all and hide what the view does
+        'PAGE_CACHE_ENABLED': False,
+        'IMAGE_CACHE_DIR': str(tmp_path / 'images'),
+        **config,
+    })
+
+
+def seed(venues, artists, shows):
+    '''`venues` venues and `artists` artists with `shows` shows between them,
+    half of them past, half upcoming'''
+    for i in range(1, venues + 1):
+        venue = Venue(name=f'The Venue {i}', city='San Francisco', state='CA',
+                      address=f'{i} Main St', image_link=f'https://example.com/venue{i}.jpg')
+        set_genres(venue, [GENRES[i % len(GENRES)], GENRES[(i + 1) % len(GENRES)]])
+        db.session.add(venue)
+    for i in range(1, artists + 1):
+        artist = Artist(name=f'Artist {i} Band', city='New York', state='NY',
+                        image_link=f'https://example.com/artist{i}.jpg')
+        set_genres(artist, [GENRES[i % len(GENRES)], GENRES[(i + 1) % len(GENRES)]])
+        db.session.add(artist)
+    db.session.flush()
+
+    start = datetime.now() - timedelta(hours=shows * 5 // 2)
+    for i in range(shows):
+        db.session.add(Show(venue_id=i % venues + 1, artist_id=i * 7 % artists + 1,
+                            event_date=start + timedelta(hours=i * 5)))
+    db.session.commit()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+# the same routes are requested against a small and a much larger dataset:
+# a view within its budget on both doesn't query per row
+
+@pytest.fixture(scope='module')
+def small_app(tmp_path_factory):
+    app = make_app(tmp_path_factory.mktemp('small'))
+    with app.app_context():
+        db.create_all()
+        seed(venues=5, artists=5, shows=10)
+    return app
+
+
+@pytest.fixture(scope='module')
+def large_app(tmp_path_factory):
+    app = make_app(tmp_path_factory.mktemp('large'))
+    with app.app_context():
+        db.create_all()
+        seed(venues=200, artists=200, shows=2000)
+    return app
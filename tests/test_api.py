@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import api
+from conftest import seed
+from models import Venue, Artist, Show
+
+
+@pytest.fixture
+def seeded(app):
+    with app.app_context():
+        seed(venues=3, artists=3, shows=12)
+    return app
+
+
+def counters(app):
+    with app.app_context():
+        return {model.__name__: [(row.upcoming_shows_count, row.past_shows_count)
+                                 for row in model.query.order_by(model.id)]
+                for model in (Venue, Artist)}
+
+
+def test_bulk_delete_takes_the_shows_with_it(seeded):
+    response = seeded.test_client().delete('/api/v1/venues', json={'ids': [1, 2]})
+    assert response.status_code == 200
+    assert response.json == {'deleted': 2}
+    with seeded.app_context():
+        assert Venue.query.count() == 1
+        assert {show.venue_id for show in Show.query} == {3}
+        for artist in Artist.query:
+            shows = Show.query.filter_by(artist_id=artist.id)
+            assert artist.upcoming_shows_count == shows.filter(Show.is_upcoming).count()
+            assert artist.past_shows_count == shows.filter(~Show.is_upcoming).count()
+
+
+@pytest.mark.parametrize('body', [None, {}, {'ids': []}, {'ids': [True]}, {'ids': ['1']},
+                                  {'ids': list(range(1, 1002))}])
+def test_bulk_delete_refuses_bad_bodies(seeded, body):
+    response = seeded.test_client().delete('/api/v1/artists', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_bulk_delete_rolls_back_on_a_database_error(seeded, monkeypatch):
+    delete_rows = api.delete_rows
+
+    def failing(model, ids):
+        delete_rows(model, ids)
+        raise OperationalError('DELETE', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(api, 'delete_rows', failing)
+    before = counters(seeded)
+    response = seeded.test_client().delete('/api/v1/shows', json={'ids': [1, 2, 3]})
+    assert response.status_code == 500
+    assert 'error' in response.json
+    with seeded.app_context():
+        assert Show.query.count() == 12
+    assert counters(seeded) == before
+
+
+@pytest.mark.parametrize('encoding', ['gzip', None])
+def test_etag_names_the_encoding_sent(seeded, encoding):
+    client = seeded.test_client()
+    headers = {'Accept-Encoding': encoding or 'identity'}
+    response = client.get('/api/v1/shows', headers=headers)
+    etag, weak = response.get_etag()
+    assert not weak
+    assert response.content_encoding == encoding
+    assert etag.endswith('-gzip') == (encoding == 'gzip')
+    assert 'Accept-Encoding' in response.vary
+
+    response = client.get('/api/v1/shows', headers={**headers, 'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag() == (etag, False)
+
+
+def test_etag_of_another_encoding_does_not_match(seeded):
+    client = seeded.test_client()
+    etag, _ = client.get('/api/v1/shows', headers={'Accept-Encoding': 'gzip'}).get_etag()
+    response = client.get('/api/v1/shows',
+                          headers={'Accept-Encoding': 'identity', 'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.content_encoding is None
@@ -0,0 +1,46 @@
+import pytest
+
+from conftest import make_app, seed
+from models import db
+
+PAGES = ['/venues', '/venues/1', '/venues/2', '/artists']
+
+VENUE_FORM = {
+    'name': 'The Venue 1', 'city': 'Oakland', 'state': 'CA', 'address': '1 Main St',
+    'phone': '', 'genres': ['Blues', 'Folk'], 'image_link': '', 'facebook_link': '',
+    'website_link': '', 'seeking_description': '',
+}
+
+
+@pytest.fixture(params=['memory', 'shared'])
+def cached_app(request, tmp_path):
+    app = make_app(tmp_path, PAGE_CACHE_ENABLED=True, PAGE_CACHE_BACKEND=request.param)
+    with app.app_context():
+        db.create_all()
+        seed(venues=3, artists=3, shows=6)
+    return app
+
+
+def cache_hit(client, url):
+    '''requests `url`, True if it was served from the page cache'''
+    hits = client.get('/cache/stats').json['hits']
+    response = client.get(url)
+    response.get_data()
+    response.close()
+    assert response.status_code == 200
+    return client.get('/cache/stats').json['hits'] == hits + 1
+
+
+def test_editing_a_venue_drops_only_its_pages(cached_app):
+    client = cached_app.test_client()
+    assert [cache_hit(client, url) for url in PAGES] == [False] * len(PAGES)
+    assert [cache_hit(client, url) for url in PAGES] == [True] * len(PAGES)
+
+    response = client.post('/venues/1/edit', data=VENUE_FORM)
+    assert response.status_code == 302
+
+    assert {url: cache_hit(client, url) for url in PAGES} == {
+        '/venues': False, '/venues/1': False, '/venues/2': True, '/artists': True,
+    }
+    # and stored again
+    assert [cache_hit(client, url) for url in PAGES] == [True] * len(PAGES)
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import seed
+from models import db, Venue, Artist, Show, past_due_shows, uncount_shows
+
+
+def counts(model, id):
+    row = db.session.get(model, id)
+    return row.upcoming_shows_count, row.past_shows_count
+
+
+def test_adding_and_deleting_shows(app):
+    with app.app_context():
+        seed(venues=2, artists=2, shows=0)
+        now = datetime.now()
+        upcoming = Show(venue_id=1, artist_id=2, event_date=now + timedelta(days=3))
+        past = Show(venue_id=1, artist_id=2, event_date=now - timedelta(days=3))
+        undated = Show(venue_id=2, artist_id=2)
+        db.session.add_all([upcoming, past, undated])
+        db.session.commit()
+        assert counts(Venue, 1) == (1, 1)
+        assert counts(Venue, 2) == (0, 1)
+        assert counts(Artist, 1) == (0, 0)
+        assert counts(Artist, 2) == (1, 2)
+
+        db.session.delete(upcoming)
+        db.session.delete(undated)
+        db.session.commit()
+        assert counts(Venue, 1) == (0, 1)
+        assert counts(Venue, 2) == (0, 0)
+        assert counts(Artist, 2) == (0, 1)
+
+
+def test_rollover_moves_shows_that_took_place(app):
+    with app.app_context():
+        seed(venues=2, artists=2, shows=0)
+        show = Show(venue_id=1, artist_id=2, event_date=datetime.now() + timedelta(days=3))
+        db.session.add(show)
+        db.session.add(Show(venue_id=1, artist_id=2, event_date=datetime.now() + timedelta(days=4)))
+        db.session.commit()
+        assert counts(Venue, 1) == (2, 0)
+        show.event_date = datetime.now() - timedelta(hours=1)
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rollover-shows'])
+    assert result.exit_code == 0, result.output
+    assert '1 shows rolled over' in result.output
+    with app.app_context():
+        assert counts(Venue, 1) == (1, 1)
+        assert counts(Artist, 2) == (1, 1)
+        assert Show.query.filter(Show.is_upcoming).count() == 1
+
+    # nothing left to move
+    result = app.test_cli_runner().invoke(args=['rollover-shows'])
+    assert '0 shows rolled over' in result.output
+    with app.app_context():
+        assert counts(Venue, 1) == (1, 1)
+
+
+def test_rollover_reads_the_upcoming_index(app):
+    with app.app_context():
+        due = db.session.query(Show.id).filter(past_due_shows(datetime.now())).statement
+        sql = due.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).all()
+    assert 'ix_Shows_event_date_upcoming' in str(plan)
+
+
+@pytest.mark.parametrize('shows, models', [
+    (Show.venue_id == 1, (Venue, Artist)),
+    (Show.artist_id.in_([1, 3]), (Venue, Artist)),
+    (Show.id.in_([2, 5, 6, 11]), (Venue,)),
+])
+def test_uncount_shows_before_a_bulk_delete(app, shows, models):
+    with app.app_context():
+        seed(venues=3, artists=3, shows=12)
+        uncount_shows(shows, *models)
+        db.session.query(Show).filter(shows).delete(synchronize_session=False)
+        db.session.commit()
+        for model in models:
+            owner = Show.venue_id if model is Venue else Show.artist_id
+            for row in model.query:
+                left = Show.query.filter(owner == row.id)
+                assert row.upcoming_shows_count == left.filter(Show.is_upcoming).count()
+                assert row.past_shows_count == left.filter(~Show.is_upcoming).count()
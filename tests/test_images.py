@@ -0,0 +1,100 @@
+import io
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import images
+from images import DiskCache, ImageProxy, fetch_image, make_thumbnails, sniff_mimetype
+
+
+def encoded(mode, size, fmt):
+    Image = pytest.importorskip('PIL.Image')
+    output = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128)[:len(mode)]).save(output, fmt)
+    return output.getvalue()
+
+
+def test_thumbnails_of_a_jpeg():
+    Image = pytest.importorskip('PIL.Image')
+    thumbnails = make_thumbnails(encoded('RGB', (1200, 600), 'JPEG'), (400, 800))
+    for width, data in thumbnails.items():
+        assert sniff_mimetype(data[:16]) == 'image/jpeg'
+        with Image.open(io.BytesIO(data)) as thumbnail:
+            assert thumbnail.size == (width, width // 2)
+
+
+def test_thumbnails_of_a_transparent_png_stay_png():
+    Image = pytest.importorskip('PIL.Image')
+    thumbnails = make_thumbnails(encoded('RGBA', (500, 500), 'PNG'), (400, 800))
+    for width, data in thumbnails.items():
+        assert sniff_mimetype(data[:16]) == 'image/png'
+        with Image.open(io.BytesIO(data)) as thumbnail:
+            assert thumbnail.mode == 'RGBA'
+            # never wider than the original
+            assert thumbnail.size == (min(width, 500),) * 2
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(host, location=None):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if location:
+                    self.send_response(302)
+                    self.send_header('Location', location)
+                    self.end_headers()
+                else:
+                    self.send_response(200)
+                    self.end_headers()
+                    self.wfile.write(b'GIF89a')
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer((host, 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://{host}:{server.server_port}/image.gif'
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_refuses_loopback(serve):
+    with pytest.raises(ValueError, match='not a public address'):
+        fetch_image(serve('127.0.0.1'), timeout=2)
+
+
+@pytest.mark.parametrize('link', ['http://localhost/', 'http://169.254.169.254/latest/meta-data/',
+                                  'http://10.0.0.1/', 'http://[::1]/', 'file:///etc/passwd'])
+def test_fetch_refuses_internal_links(link):
+    with pytest.raises(ValueError):
+        fetch_image(link, timeout=2)
+
+
+def test_fetch_checks_every_redirect(serve, monkeypatch):
+    # 127.0.0.1 stands in for a public host redirecting to an internal one
+    monkeypatch.setattr(images, '_public_address', lambda address: address == '127.0.0.1')
+    assert fetch_image(serve('127.0.0.1'), timeout=2) == b'GIF89a'
+    with pytest.raises(ValueError, match='127.0.0.2'):
+        fetch_image(serve('127.0.0.1', location=serve('127.0.0.2')), timeout=2)
+    with pytest.raises(urllib.error.HTTPError, match='not allowed'):
+        fetch_image(serve('127.0.0.1', location='file:///etc/passwd'), timeout=2)
+
+
+def test_failed_links_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(images, 'MAX_FAILED', 10)
+
+    def fetch(url):
+        raise OSError('unreachable')
+
+    proxy = ImageProxy(DiskCache(str(tmp_path), 1024), (400,), fetch, 'secret')
+    for number in range(25):
+        assert proxy.thumbnail(f'https://example.com/{number}.jpg', 400) is None
+    assert len(proxy._failed) <= 10
@@ -0,0 +1,30 @@
+import html
+import re
+
+from conftest import seed
+
+NEXT_LINK = re.compile(r'<li class="next"><a href="([^"]+)"')
+ARTIST_LINK = re.compile(r'<a href="/artists/(\d+)">')
+
+
+def follow_pages(client, url):
+    '''the ids listed on `url` and every page its "next" links lead to'''
+    ids = []
+    while url:
+        response = client.get(url)
+        body = response.get_data(as_text=True)
+        response.close()
+        assert response.status_code == 200
+        ids.extend(int(id) for id in ARTIST_LINK.findall(body))
+        url = next((html.unescape(link) for link in NEXT_LINK.findall(body)), None)
+        if url:
+            assert url.count('genre=') == 2, url
+    return ids
+
+
+def test_next_link_keeps_every_genre(app):
+    with app.app_context():
+        # artist i plays GENRES[i % 5] and GENRES[(i + 1) % 5]: Jazz and Blues when i % 5 == 0
+        seed(venues=1, artists=30, shows=0)
+    ids = follow_pages(app.test_client(), '/artists?genre=Jazz&genre=Blues&per_page=2')
+    assert ids == [5, 10, 15, 20, 25, 30]
@@ -0,0 +1,139 @@
+import logging
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, text
+
+from models import db
+from query_budget import QueryBudgetExceeded, query_budget
+
+VENUE_FORM = {
+    'name': 'The Test Hall', 'city': 'Austin', 'state': 'TX', 'address': '1 Test St',
+    'phone': '512-555-0100', 'genres': ['Jazz', 'Folk'], 'image_link': '',
+    'facebook_link': '', 'website_link': '', 'seeking_description': '',
+}
+ARTIST_FORM = {
+    'name': 'The Test Trio', 'city': 'Austin', 'state': 'TX', 'phone': '512-555-0101',
+    'genres': ['Jazz'], 'image_link': '', 'facebook_link': '', 'website_link': '',
+    'seeking_description': '',
+}
+
+# (endpoint, method, url, request options); deletes and edits name ids that
+# exist in both datasets and that no other request depends on
+ROUTES = [
+    ('index', 'GET', '/', {}),
+    ('cache_stats', 'GET', '/cache/stats', {}),
+    ('metrics', 'GET', '/metrics', {}),
+
+    ('venues.venues', 'GET', '/venues', {}),
+    ('venues.venues', 'GET', '/venues?upcoming=1&per_page=100', {}),
+    ('venues.search_venues', 'POST', '/venues/search', {'data': {'search_term': 'venue'}}),
+    ('venues.show_venue', 'GET', '/venues/1', {}),
+    ('venues.create_venue_form', 'GET', '/venues/create', {}),
+    ('venues.create_venue_submission', 'POST', '/venues/create', {'data': VENUE_FORM}),
+    ('venues.edit_venue', 'GET', '/venues/2/edit', {}),
+    ('venues.edit_venue_submission', 'POST', '/venues/2/edit', {'data': VENUE_FORM}),
+    # a genre no venue or artist has yet
+    ('venues.edit_venue_submission', 'POST', '/venues/4/edit',
+     {'data': {**VENUE_FORM, 'genres': ['Jazz', 'Soul']}}),
+    ('venues.delete_venue', 'DELETE', '/venues/3/del', {}),
+
+    ('artists.artists', 'GET', '/artists', {}),
+    ('artists.search_artists', 'POST', '/artists/search', {'data': {'search_term': 'band'}}),
+    ('artists.show_artist', 'GET', '/artists/1', {}),
+    ('artists.create_artist_form', 'GET', '/artists/create', {}),
+    ('artists.create_artist_submission', 'POST', '/artists/create', {'data': ARTIST_FORM}),
+    ('artists.edit_artist', 'GET', '/artists/2/edit', {}),
+    ('artists.edit_artist_submission', 'POST', '/artists/2/edit', {'data': ARTIST_FORM}),
+    ('artists.edit_artist_submission', 'POST', '/artists/3/edit',
+     {'data': {**ARTIST_FORM, 'genres': ['Jazz', 'Funk']}}),
+
+    ('shows.shows', 'GET', '/shows', {}),
+    ('shows.shows', 'GET', '/shows?upcoming=1&per_page=100', {}),
+    ('shows.shows', 'GET', '/shows?venue_id=1&from=2000-01-01', {}),
+    ('shows.create_shows', 'GET', '/shows/create', {}),
+    ('shows.create_show_submission', 'POST', '/shows/create',
+     {'data': {'venue_id': '1', 'artist_id': '1', 'start_time': '2099-01-01 20:00:00'}}),
+
+    ('api.api_list', 'GET', '/api/v1/venues', {}),
+    ('api.api_list', 'GET', '/api/v1/artists?upcoming=1', {}),
+    ('api.api_list', 'GET', '/api/v1/shows?per_page=100', {}),
+    ('api.api_detail', 'GET', '/api/v1/venues/1', {}),
+    ('api.api_detail', 'GET', '/api/v1/artists/1', {}),
+    ('api.api_detail', 'GET', '/api/v1/shows/1', {}),
+    ('api.api_typeahead', 'GET', '/api/v1/artists/typeahead?q=art', {}),
+    ('api.export', 'GET', '/export/shows.jsonl', {}),
+    ('api.export', 'GET', '/export/venues.csv', {}),
+    ('api.api_bulk_delete', 'DELETE', '/api/v1/shows', {'json': {'ids': [4, 5, 6]}}),
+    ('api.api_bulk_delete', 'DELETE', '/api/v1/artists', {'json': {'ids': [4]}}),
+]
+
+# served without touching the database
+UNBUDGETED = {'static', 'asset', 'image'}
+
+
+@contextmanager
+def counted(app):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'after_cursor_execute', count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'after_cursor_execute', count)
+
+
+def request_statements(app, method, url, options):
+    '''the statements a request runs, its streamed body included'''
+    client = app.test_client()
+    with counted(app) as statements:
+        response = client.open(url, method=method, **options)
+        response.get_data()
+        response.close()
+    assert response.status_code < 400, f'{method} {url}: {response.status_code}'
+    return len(statements)
+
+
+@pytest.mark.parametrize('endpoint, method, url, options', ROUTES,
+                         ids=[f'{method} {url}' for _, method, url, _ in ROUTES])
+def test_route_queries_do_not_grow_with_data(small_app, large_app, endpoint, method, url, options):
+    # an overrun raises QueryBudgetExceeded out of the request
+    small = request_statements(small_app, method, url, options)
+    large = request_statements(large_app, method, url, options)
+    assert large == small
+
+
+def test_every_route_is_requested(small_app):
+    endpoints = {rule.endpoint for rule in small_app.url_map.iter_rules()} - UNBUDGETED
+    assert endpoints - {endpoint for endpoint, _, _, _ in ROUTES} == set()
+
+
+def test_overrun_raises(app):
+    with app.app_context():
+        with pytest.raises(QueryBudgetExceeded, match='2 SQL statements, budget 1'):
+            with query_budget(1, 'two selects'):
+                db.session.execute(text('SELECT 1'))
+                db.session.execute(text('SELECT 2'))
+
+
+def test_overrun_warns_with_the_statements(app, caplog):
+    app.config['QUERY_BUDGET'] = 'warn'
+    with app.app_context(), caplog.at_level(logging.WARNING):
+        with query_budget(1, 'two selects'):
+            db.session.execute(text('SELECT 1'))
+            db.session.execute(text('SELECT 2'))
+    assert 'two selects: 2 SQL statements, budget 1' in caplog.text
+    assert '2. SELECT 2' in caplog.text
+
+
+def test_off_does_not_count(app):
+    app.config['QUERY_BUDGET'] = 'off'
+    with app.app_context():
+        with query_budget(0) as budget:
+            db.session.execute(text('SELECT 1'))
+    assert budget.statements == []
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import seed
+from models import db, Show
+
+BOOKED = datetime(2099, 1, 1, 20, 0)
+
+
+@pytest.fixture
+def booked(app):
+    # venue 1 and artist 1 have a show at BOOKED; the slot is 3 hours either side
+    assert app.config['BOOKING_SLOT_HOURS'] == 3
+    with app.app_context():
+        seed(venues=2, artists=2, shows=0)
+        db.session.add(Show(venue_id=1, artist_id=1, event_date=BOOKED))
+        db.session.commit()
+    return app
+
+
+def book(app, venue_id, artist_id, start_time):
+    response = app.test_client().post('/shows/create', data={
+        'venue_id': str(venue_id), 'artist_id': str(artist_id), 'start_time': start_time})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def shows(app):
+    with app.app_context():
+        return Show.query.count()
+
+
+@pytest.mark.parametrize('venue_id, artist_id, start_time, booked_message', [
+    (1, 2, '2099-01-01 21:00:00', 'the venue is already booked within 3 hours'),
+    (1, 2, '2099-01-01 17:01:00', 'the venue is already booked within 3 hours'),
+    (2, 1, '2099-01-01 22:59:00', 'the artist is already booked within 3 hours'),
+    (1, 1, '2099-01-01 20:00:00', 'the venue and the artist are already booked'),
+])
+def test_overlapping_booking_is_refused(booked, venue_id, artist_id, start_time, booked_message):
+    page = book(booked, venue_id, artist_id, start_time)
+    assert booked_message in page
+    assert shows(booked) == 1
+    # the form again, with the names that were picked
+    assert f'value="The Venue {venue_id}"' in page
+    assert f'value="Artist {artist_id} Band"' in page
+
+
+@pytest.mark.parametrize('start_time', ['2099-01-01 23:00:00', '2099-01-01 17:00:00'])
+def test_booking_just_outside_the_slot(booked, start_time):
+    page = book(booked, 1, 1, start_time)
+    assert 'Show was successfully listed!' in page
+    assert shows(booked) == 2
@@ -0,0 +1,107 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+# Typeahead over venue and artist names, for the new show form.
+# Each worker keeps an entity's names in memory, lowercased and sorted, once
+# whole and once from each later word on ('The Musical Hop' is also found by
+# 'musical' and 'hop'), so a lookup is a bisect followed by the next few
+# entries. Names matching from their first word come first, then the others,
+# each alphabetically.
+#
+# An entity's index is loaded with one query when first asked for, and again
+# after `ttl` seconds or an `invalidate()`. Write handlers invalidate the
+# index of their own worker; the others catch up within the ttl. Results of
+# recent prefixes are kept too, since everyone types the same first letters.
+
+
+def normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+class PrefixIndex:
+    '''sorted names of one entity, from rows of (id, name, city, state)'''
+
+    def __init__(self, rows):
+        self.rows = {}
+        tiers = [([], []), ([], [])]  # (keys, ids) of whole names, of later words
+        for id, name, city, state in rows:
+            key = normalize(name)
+            if not key:
+                continue
+            self.rows[id] = {'id': id, 'name': name, 'city': city, 'state': state}
+            tiers[0][0].append(key)
+            tiers[0][1].append(id)
+            position = key.find(' ')
+            while position != -1:
+                tiers[1][0].append(key[position + 1:])
+                tiers[1][1].append(id)
+                position = key.find(' ', position + 1)
+        # keys and ids in parallel lists, bisecting plain strings is the fast path
+        self._tiers = []
+        for keys, ids in tiers:
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            self._tiers.append(([keys[i] for i in order], [ids[i] for i in order]))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, prefix, limit):
+        found = []
+        for keys, ids in self._tiers:
+            position = bisect_left(keys, prefix)
+            while position < len(keys) and len(found) < limit and \
+                    keys[position].startswith(prefix):
+                if ids[position] not in found:
+                    found.append(ids[position])
+                position += 1
+        return [self.rows[id] for id in found]
+
+
+class NameIndex:
+    '''
+    prefix indexes of the entities `load(entity)` returns rows for, rebuilt
+    every `ttl` seconds, with the results of the last `cache_size` lookups
+    '''
+
+    def __init__(self, load, ttl=60, cache_size=1024):
+        self.load = load
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._indexes = {}  # entity -> (expires, PrefixIndex, recent lookups)
+        self._lock = threading.Lock()
+
+    def _index(self, entity):
+        entry = self._indexes.get(entity)
+        if entry is None or entry[0] < time.monotonic():
+            with self._lock:
+                # another thread may have loaded it while this one waited
+                entry = self._indexes.get(entity)
+                if entry is None or entry[0] < time.monotonic():
+                    entry = (time.monotonic() + self.ttl,
+                             PrefixIndex(self.load(entity)), OrderedDict())
+                    self._indexes[entity] = entry
+        return entry
+
+    def lookup(self, entity, prefix, limit):
+        '''the first `limit` names of `entity` matching the normalized `prefix`'''
+        _, index, recent = self._index(entity)
+        key = (prefix, limit)
+        with self._lock:
+            matches = recent.get(key)
+            if matches is not None:
+                recent.move_to_end(key)
+                return matches
+        matches = index.lookup(prefix, limit)
+        with self._lock:
+            recent[key] = matches
+            while len(recent) > self.cache_size:
+                recent.popitem(last=False)
+        return matches
+
+    def invalidate(self, *entities):
+        with self._lock:
+            for entity in entities:
+                self._indexes.pop(entity, None)
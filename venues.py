@@ -0,0 +1,231 @@
+from itertools import groupby
+
+from flask import Blueprint, abort, current_app, flash, jsonify, redirect, render_template, request, url_for
+
+import search
+from database import replica_reads
+from helpers import cache_tags, cached_page, listing_filters, name_index, page_cache, paginate, \
+    stream_page, venue_page, venue_shows_query
+from models import db, Venue, delete_rows, set_genres, split_genres
+from query_budget import query_budget
+
+# forms are imported by the views that use them, wtforms isn't needed to start up
+
+bp = Blueprint('venues', __name__)
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+
+# venue list page
+@bp.route('/venues')
+@query_budget(1)
+@cached_page
+@replica_reads
+def venues():
+    # TODO: replace with real venues data.
+    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
+
+    # upcoming show counts are stored on the venue row, no aggregation needed
+    venue_qs = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state,
+        Venue.upcoming_shows_count.label('num_upcoming_shows')).\
+        filter(*listing_filters(Venue))
+
+    page = paginate(venue_qs, [Venue.id], lambda row: (row.id,))
+
+    def areas():
+        # run by the template as it streams, the query with it
+        cache_tags('venues', *[f'venue:{row.id}' for row in page])
+        # venues of the same (city, state) must sit next to each other for groupby
+        rows = sorted(page.items, key=lambda row: (row.state or '', row.city or '', row.id))
+        for (city, state), loc_qs in groupby(rows, key=lambda row: (row.city, row.state)):
+            yield {
+                'city': city,
+                'state': state,
+                'venues': [{
+                    'id': venue_loc.id,
+                    'name': venue_loc.name,
+                    'num_upcoming_shows': venue_loc.num_upcoming_shows
+                } for venue_loc in loc_qs],
+            }
+
+    return stream_page('pages/venues.html', areas=areas(), page=page)
+
+
+# venue search result page
+@bp.route('/venues/search', methods=['POST'])
+@query_budget(1)
+@replica_reads
+def search_venues():
+    # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
+    # seach for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+    search_keyword = request.form.get('search_term', '')
+
+    # ranked, limited matches with their total in one round trip
+    count, qs = search.search(db.session, Venue, search_keyword, current_app.config['SEARCH_LIMIT'],
+                              Venue.upcoming_shows_count.label('num_upcoming_shows'),
+                              filters=listing_filters(Venue))
+
+    response = {
+        "count": count,
+        "data": [{
+            'id': result.id,
+            'name': result.name,
+            'num_upcoming_shows': result.num_upcoming_shows
+        } for result in qs]
+    }
+    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+
+
+# venue details page
+@bp.route('/venues/<int:venue_id>')
+@query_budget(2)
+@cached_page
+@replica_reads
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # TODO: replace with real venue data from the venues table, using venue_id
+    venue = Venue.query.filter_by(id=venue_id).first()
+
+    if not venue:  # if page does not exist rediirect to venue list
+        return redirect(url_for('venues.venues'))
+
+    # about shows, all fetched in one query
+    return venue_page(venue, venue_shows_query(venue.id))
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+
+@bp.route('/venues/create', methods=['GET'])
+@query_budget(0)
+def create_venue_form():
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/create', methods=['POST'])
+@query_budget(5)
+def create_venue_submission():
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+    from forms import VenueForm
+    form = VenueForm(request.form)
+
+    try:
+        data = Venue(
+            name=form.name.data,
+            city=form.city.data,
+            state=form.state.data,
+            address=form.address.data,
+            phone=form.phone.data,
+            facebook_link=form.facebook_link.data,
+            image_link=form.image_link.data,
+            website_link=form.website_link.data,
+            talent_search=form.seeking_talent.data,
+            seeking_description=form.seeking_description.data,
+        )
+        set_genres(data, form.genres.data)
+        db.session.add(data)
+        db.session.commit()
+        page_cache.invalidate('venues')
+        name_index.invalidate('venues')
+
+        # on successful db insert, flash success
+        flash('Venue ' + request.form['name'] + ' was successfully listed!')
+    except:
+        print(form.errors)
+        db.session.rollback()
+
+        # TODO: on unsuccessful db insert, flash an error instead.
+        flash('An error occurred. Venue ' +
+              request.form.get('name') + ' could not be listed.')
+        # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
+
+
+# NB: modified url route a bit
+@bp.route('/venues/<venue_id>/del', methods=['DELETE'])
+@query_budget(2)
+def delete_venue(venue_id):
+    # TODO: Complete this endpoint for taking a venue_id, and using
+    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    error = False
+    try:
+        # its artists' counters, then the venue; the database deletes its shows
+        if not delete_rows(Venue, [int(venue_id)]):
+            raise LookupError(f'no venue {venue_id}')
+        db.session.commit()
+        # every page showing its shows is tagged with the venue; the artists
+        # listing filters on the counters
+        page_cache.invalidate(f'venue:{venue_id}', 'venues', 'artists')
+        name_index.invalidate('venues')
+    except:
+        error = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+    # clicking that button delete it from the db then redirect the user to the homepage
+
+    # implemented on venues details page /venues/<venue_id>;
+    if error:
+        abort(400)
+        return jsonify({'successful?': False})
+    else:
+        return jsonify({'successful?': True})
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_budget(1)
+def edit_venue(venue_id):
+    from forms import VenueForm
+    venue = Venue.query.get(venue_id)
+    form = VenueForm(obj=venue)
+
+    form.genres.data = split_genres(venue.genres)
+    # TODO: populate form with values from venue with ID <venue_id>
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@query_budget(8)
+def edit_venue_submission(venue_id):
+    # TODO: take values from the form submitted, and update existing
+    # venue record with ID <venue_id> using the new attributes
+
+    from forms import VenueForm
+    try:
+        form = VenueForm()
+        venue = Venue.query.get(venue_id)
+
+        venue.name = form.name.data
+        venue.address = form.address.data
+        venue.city = form.city.data
+        venue.state = form.state.data
+        venue.phone = form.phone.data
+        venue.website_link = form.website_link.data
+        venue.facebook_link = form.facebook_link.data
+        venue.talent_search = form.seeking_talent.data
+        venue.seeking_description = form.seeking_description.data
+        venue.image_link = form.image_link.data
+        # last: its Genre lookup autoflushes, any column set after it would
+        # take a second UPDATE
+        set_genres(venue, form.genres.data)
+
+        db.session.commit()
+        page_cache.invalidate(f'venue:{venue_id}', 'venues')
+        name_index.invalidate('venues')
+    except:
+        db.session.rollback()
+    finally:
+        db.session.close()
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))